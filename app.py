@@ -7,13 +7,28 @@
 
 # Made by Nezar Bahid @ AUI 
 # =============================================================================
+import os
 from src.Routing import *
+from src.Jobs import start_jobs
+from src.Assets import init_assets, init_templates
+from src import Maintenance  # Registers the database maintenance job and gauges
 
 # =============================================================================
 # APPLICATION STARTUP                                                         =
 # =============================================================================
 
 app.register_blueprint(main_bp)
+
+# Fingerprinted, precompressed static files (see build_assets.py)
+init_assets()
+# Compile every template now instead of on the first requests
+init_templates()
+
+# Background jobs (hot score decay...) run in the process serving requests,
+# not in the debug reloader's file-watcher process.
+if __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    start_jobs()
+
 if __name__ == "__main__":
     """
     Start the Flask development server.
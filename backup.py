@@ -0,0 +1,326 @@
+# =============================================================================
+# Gallario - BACKUP, EXPORT AND IMPORT TOOL                                   =
+# =============================================================================
+# All of Gallario's state is src/database.db plus the files in
+# src/static/uploads, src/static/avatars and src/static/thumbs.
+# This tool moves that state around while the app keeps running:
+#
+#   python backup.py snapshot backups/2025-10-01
+#       Consistent copy of the database (SQLite online backup API) and of
+#       every media file, with a manifest.json describing both.
+#
+#   python backup.py export exports/full
+#   python backup.py export exports/daily --since backups/2025-10-01/manifest.json
+#       Rows as JSON lines (one file per table) plus media files. With --since,
+#       only rows and files added after that snapshot/export are included.
+#       Rows changed in place (counters, avatars, descriptions, seen flags)
+#       are not tracked, take a new snapshot now and then.
+#
+#   python backup.py import exports/full
+#       Loads an export into this instance: rows are inserted in large
+#       transactions with their ids, counters are recomputed, then media
+#       files are copied in parallel. Ids are kept, so an instance only
+#       accepts a full export while empty, and a --since export once it
+#       holds exactly the data that export was made against (nothing
+#       added locally in between); anything else is refused.
+# =============================================================================
+import argparse               # Command line interface
+import json                   # Manifest and row files
+import os                     # File system operations
+import queue                  # Hand parsed batches to the inserting thread
+import shutil                 # Copying media files
+import sqlite3                # Database operations
+import sys                    # Exit status
+import threading              # Parse rows while inserting
+from concurrent.futures import ThreadPoolExecutor  # Parallel file copies
+from datetime import datetime # Manifest timestamps
+
+from src.Config import *
+from src.Helpers import connect_db, POST_AGE_HOURS_SQL
+
+# Tables moved by export/import, parents before children (foreign keys).
+# user_stats and file_deletions are local bookkeeping and are rebuilt instead.
+TABLES = ["users", "posts", "likes", "comments", "notifications", "dms"]
+MEDIA_FOLDERS = ["uploads", "avatars", "thumbs"]
+IMPORT_BATCH = 10_000   # Rows per import transaction
+COPY_WORKERS = 8        # Parallel media file copies
+
+# =============================================================================
+# SHARED HELPERS
+# =============================================================================
+
+def open_source():
+    """
+    Plain connection to the live database, without type conversion so
+    every value can be written to JSON as stored.
+    """
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def media_manifest():
+    """
+    Describe every media file: {"uploads/<name>": {"size": .., "mtime": ..}, ...}
+    """
+    files = {}
+    for folder in MEDIA_FOLDERS:
+        directory = os.path.join(BASE_DIR, "static", folder)
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                stat = entry.stat()
+                files[f"{folder}/{entry.name}"] = {"size": stat.st_size, "mtime": stat.st_mtime}
+    return files
+
+def copy_media(paths, source_root, dest_root, keep_times=True):
+    """
+    Copy media files (paths relative to the roots) using COPY_WORKERS threads.
+    Files deleted in the meantime are skipped. Returns how many were copied.
+    With keep_times=False the copies get the current time as mtime.
+    """
+    copy = shutil.copy2 if keep_times else shutil.copyfile
+
+    def copy_one(path):
+        dest = os.path.join(dest_root, path)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            copy(os.path.join(source_root, path), dest)
+            return 1
+        except FileNotFoundError:
+            return 0  # Removed by the file collector since the listing
+
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as pool:
+        return sum(pool.map(copy_one, paths))
+
+def max_ids(conn):
+    """
+    Highest id of every exported table, the starting point of the next --since export.
+    """
+    return {t: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {t}").fetchone()[0] for t in TABLES}
+
+def write_manifest(dest, kind, ids, media, since_ids=None):
+    with open(os.path.join(dest, "manifest.json"), "w") as f:
+        json.dump({
+            "kind": kind,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "max_ids": ids,
+            "since_max_ids": since_ids or {},  # Rows up to these ids are not in this export
+            "media": media,
+        }, f, indent=1)
+
+# =============================================================================
+# SNAPSHOT
+# =============================================================================
+
+def snapshot(dest):
+    """
+    Copy the database with the SQLite online backup API, then the media files.
+    The backup runs in a single read transaction: the copy is consistent, and
+    since the database is in WAL mode the app keeps writing meanwhile
+    (a page-by-page backup would restart every time the app commits).
+    """
+    os.makedirs(dest, exist_ok=True)
+    source = open_source()
+    target = sqlite3.connect(os.path.join(dest, "database.db"))
+    source.backup(target)
+    ids = max_ids(target)
+    target.close()
+    source.close()
+
+    media = media_manifest()
+    copied = copy_media(list(media), os.path.join(BASE_DIR, "static"), os.path.join(dest, "media"))
+    write_manifest(dest, "snapshot", ids, media)
+    print(f"Snapshot written to {dest}: database + {copied} media files.")
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def export(dest, since=None):
+    """
+    Write rows as JSON lines (rows/<table>.jsonl) and copy media files.
+    With `since` (a previous manifest), only rows with a higher id and
+    files that are new or changed are exported.
+    """
+    previous = {"max_ids": {}, "media": {}}
+    if since:
+        with open(since) as f:
+            previous = json.load(f)
+
+    os.makedirs(os.path.join(dest, "rows"), exist_ok=True)
+    conn = open_source()
+    conn.execute("BEGIN")  # One read transaction: every table from the same moment
+    counts = {}
+    for table in TABLES:
+        start = previous["max_ids"].get(table, 0)
+        with open(os.path.join(dest, "rows", f"{table}.jsonl"), "w") as f:
+            counts[table] = 0
+            for row in conn.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (start,)):
+                f.write(json.dumps(dict(row)) + "\n")
+                counts[table] += 1
+    ids = max_ids(conn)
+    conn.execute("COMMIT")
+    conn.close()
+
+    media = media_manifest()
+    changed = [p for p, info in media.items() if previous["media"].get(p) != info]
+    copied = copy_media(changed, os.path.join(BASE_DIR, "static"), os.path.join(dest, "media"))
+    write_manifest(dest, "export", ids, media, previous["max_ids"])
+    print(f"Export written to {dest}: " + ", ".join(f"{n} {t}" for t, n in counts.items()) + f", {copied} media files.")
+
+# =============================================================================
+# IMPORT
+# =============================================================================
+
+def read_batches(path, batches):
+    """
+    Producer thread: parse a .jsonl file into lists of IMPORT_BATCH rows.
+    A None marks the end of the file.
+    """
+    batch = []
+    with open(path) as f:
+        for line in f:
+            batch.append(json.loads(line))
+            if len(batch) == IMPORT_BATCH:
+                batches.put(batch)
+                batch = []
+    if batch:
+        batches.put(batch)
+    batches.put(None)
+
+def insert_table(conn, table, path):
+    """
+    Insert every row of one table, one transaction per batch, while the
+    next batch is being parsed.
+    Returns (inserted rows, post ids touched by likes/comments).
+    """
+    columns = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+    batches = queue.Queue(maxsize=4)
+    threading.Thread(target=read_batches, args=(path, batches), daemon=True).start()
+
+    inserted, touched = 0, set()
+    while True:
+        batch = batches.get()
+        if batch is None:
+            break
+        # Only columns this instance knows (the source may be older or newer)
+        cols = [c for c in batch[0] if c in columns]
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.executemany(
+            f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+            ([row.get(c) for c in cols] for row in batch)
+        )
+        conn.execute("COMMIT")
+        inserted += cur.rowcount
+        if table in ("likes", "comments"):
+            touched.update(row["post_id"] for row in batch)
+    return inserted, touched
+
+def refresh_counters(conn, post_ids):
+    """
+    Recount reactions of posts that received imported likes/comments and
+    rebuild the per-user totals, so the denormalized counters stay right.
+    user_stats is rebuilt in the same transaction, so the running app
+    never sees it missing or half filled.
+    """
+    post_ids = list(post_ids)
+    conn.execute("BEGIN IMMEDIATE")
+    for start in range(0, len(post_ids), 500):
+        chunk = post_ids[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        conn.execute(f"""
+            UPDATE posts SET
+                like_count    = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id AND likes.value = 1),
+                dislike_count = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id AND likes.value = -1),
+                comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)
+            WHERE id IN ({marks})
+        """, chunk)
+        conn.execute(f"""
+            UPDATE posts SET
+                score = like_count - dislike_count + comment_count,
+                hot = hot_score(like_count - dislike_count + comment_count, {POST_AGE_HOURS_SQL})
+            WHERE id IN ({marks})
+        """, chunk)
+    conn.execute("DELETE FROM user_stats")
+    conn.execute("""
+        INSERT INTO user_stats (user_id, post_count, like_count)
+            SELECT user_id, COUNT(*), SUM(like_count) FROM posts
+            WHERE user_id IS NOT NULL GROUP BY user_id
+    """)
+    conn.execute("COMMIT")
+
+def check_target(conn, manifest):
+    """
+    Ids are imported as they are, so the local tables must end exactly
+    where the export starts: empty for a full export, the max ids of the
+    previous snapshot/export for a --since export (so its rows neither
+    collide with local ones nor point at rows that were never imported).
+    Returns the tables that don't match, with their local max id.
+    """
+    base = manifest.get("since_max_ids", {})
+    local = max_ids(conn)
+    return {t: n for t, n in local.items() if n != base.get(t, 0)}
+
+def import_export(source):
+    """
+    Load an export directory into this instance's database and media folders.
+    Media files are copied once the rows pointing to them are committed, with
+    fresh mtimes, so the orphan sweep never takes them for leftovers.
+    """
+    with open(os.path.join(source, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    conn = connect_db()
+    conn.isolation_level = None  # Transactions are managed per batch
+    conflicts = check_target(conn, manifest)
+    if conflicts:
+        conn.close()
+        sys.exit("Refusing to import: this database doesn't end where the export starts ("
+                 + ", ".join(f"{t} up to id {n}" for t, n in conflicts.items())
+                 + "). Import full exports into an empty instance and --since exports in order.")
+
+    # Rows are copied as they were in the source, including references to
+    # rows it had already deleted, so don't re-check every foreign key
+    conn.execute("PRAGMA foreign_keys = OFF")
+    counts, touched = {}, set()
+    for table in TABLES:
+        path = os.path.join(source, "rows", f"{table}.jsonl")
+        if os.path.exists(path):
+            counts[table], posts = insert_table(conn, table, path)
+            touched |= posts
+    refresh_counters(conn, touched)
+    conn.close()
+
+    media_root = os.path.join(source, "media")
+    media = []
+    for folder in MEDIA_FOLDERS:
+        if os.path.isdir(os.path.join(media_root, folder)):
+            media += [f"{folder}/{name}" for name in os.listdir(os.path.join(media_root, folder))]
+    copied = copy_media(media, media_root, os.path.join(BASE_DIR, "static"), keep_times=False)
+
+    print("Imported " + ", ".join(f"{n} {t}" for t, n in counts.items()) + f", {copied} media files.")
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gallario - backup, export and import the database and media.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("snapshot", help="Consistent copy of the database and media files.")
+    cmd.add_argument("dest", help="Folder to write the snapshot to.")
+
+    cmd = commands.add_parser("export", help="Rows as JSON lines plus media files.")
+    cmd.add_argument("dest", help="Folder to write the export to.")
+    cmd.add_argument("--since", help="manifest.json of a previous snapshot/export: only export what was added after it.")
+
+    cmd = commands.add_parser("import", help="Load an export into this instance.")
+    cmd.add_argument("source", help="Folder written by the export command.")
+
+    args = parser.parse_args()
+    if args.command == "snapshot":
+        snapshot(args.dest)
+    elif args.command == "export":
+        export(args.dest, args.since)
+    else:
+        import_export(args.source)
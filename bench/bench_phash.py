@@ -0,0 +1,119 @@
+# =============================================================================
+# NEAR-DUPLICATE LOOKUP BENCHMARK
+# =============================================================================
+# Measures find_near_duplicate() (multi-index hashing over the indexed
+# phash0..phash3 columns) against a table of random 64-bit hashes, and
+# compares it with a full scan computing the Hamming distance of every row.
+# Real uploads don't have uniformly random hashes: --skew is the share of
+# low-detail images (few set bits, so many all-zero bands), which makes
+# band value 0 a long candidate list. Part of them are flat enough to be
+# degenerate and are left out of the index.
+#
+# Run from the repository root:
+#   python bench/bench_phash.py --hashes 1000000 --queries 2000 --skew 0.2
+# The benchmark works on a throwaway database in a temp folder.
+# =============================================================================
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description="Gallario - perceptual hash lookup latency")
+parser.add_argument("--hashes", type=int, default=1_000_000, help="Number of stored hashes.")
+parser.add_argument("--queries", type=int, default=2000, help="Number of indexed lookups to time.")
+parser.add_argument("--scans", type=int, default=3, help="Number of full-scan lookups to time (slow).")
+parser.add_argument("--skew", type=float, default=0.2, help="Share of low-detail hashes (0 = uniformly random).")
+bench_args = parser.parse_args()
+
+# Point the app at a throwaway database before anything opens it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+tmp_dir = tempfile.mkdtemp(prefix="gallario-bench-")
+import src.Config as Config
+Config.DB_PATH = os.path.join(tmp_dir, "phash.db")
+import src.Helpers as Helpers  # Creates the schema in phash.db
+
+def low_detail_hash(rng):
+    """
+    Hash of a smooth image: only a handful of bits set.
+    """
+    phash = 0
+    for bit in rng.sample(range(64), rng.randint(0, 12)):
+        phash |= 1 << bit
+    return phash
+
+def seed(count, skew):
+    """
+    Insert `count` posts, a `skew` share of them with low-detail hashes and
+    the rest random. Returns the hashes (unsigned).
+    """
+    rng = random.Random(42)
+    hashes = [low_detail_hash(rng) if rng.random() < skew else rng.getrandbits(64) for _ in range(count)]
+    conn = Helpers.connect_db()
+    conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'x')")
+    for start in range(0, count, 100_000):
+        conn.executemany(
+            "INSERT INTO posts (user_id, image, phash, phash0, phash1, phash2, phash3) VALUES (1, 'img.png', ?, ?, ?, ?, ?)",
+            (Helpers.phash_columns(h) for h in hashes[start:start + 100_000])
+        )
+    conn.commit()
+    conn.close()
+    return hashes
+
+def flip_bits(phash, bits, rng):
+    """
+    Return `phash` with `bits` random bits flipped (a near-duplicate).
+    """
+    for bit in rng.sample(range(64), bits):
+        phash ^= 1 << bit
+    return phash
+
+def full_scan(conn, phash):
+    """
+    Baseline without the band indexes: check every stored hash.
+    """
+    signed = Helpers.phash_columns(phash)[0]
+    for row in conn.execute("SELECT id, phash FROM posts ORDER BY id"):
+        if Helpers.hamming_distance(row["phash"], signed) <= Config.DUPLICATE_MAX_DISTANCE:
+            return row["id"]
+    return None
+
+def timed(fn, conn, queries):
+    """
+    Run fn(conn, q) for every query. Returns (latencies in ms, number of matches).
+    """
+    latencies, found = [], 0
+    for q in queries:
+        start = time.perf_counter()
+        found += fn(conn, q) is not None
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, found
+
+def report(name, latencies, found):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<28}{len(latencies):>8}{statistics.median(latencies):>10.3f}{p99:>10.3f}{found:>8}")
+
+if __name__ == "__main__":
+    print(f"Seeding {bench_args.hashes} hashes...")
+    hashes = seed(bench_args.hashes, bench_args.skew)
+    rng = random.Random(7)
+    conn = Helpers.get_db()
+
+    detailed = [h for h in hashes if not Helpers.is_degenerate_phash(h)]
+    low_detail = [h for h in detailed if bin(h).count("1") <= 12]
+    print(f"{len(hashes) - len(detailed)} degenerate hashes (not indexed), {len(low_detail)} low-detail hashes")
+    near = [flip_bits(rng.choice(detailed), Config.DUPLICATE_MAX_DISTANCE, rng) for _ in range(bench_args.queries)]
+    misses = [rng.getrandbits(64) for _ in range(bench_args.queries)]
+    # Near-duplicates of low-detail images: their all-zero bands hit the longest candidate lists
+    smooth = [flip_bits(rng.choice(low_detail), 1, rng) for _ in range(bench_args.queries)] if low_detail else []
+
+    print(f"{'lookup':<28}{'queries':>8}{'p50 ms':>10}{'p99 ms':>10}{'found':>8}")
+    report("indexed, near-duplicate", *timed(Helpers.find_near_duplicate, conn, near))
+    report("indexed, no match", *timed(Helpers.find_near_duplicate, conn, misses))
+    if smooth:
+        report("indexed, low-detail", *timed(Helpers.find_near_duplicate, conn, smooth))
+    report("full scan, near-duplicate", *timed(full_scan, conn, near[:bench_args.scans]))
+    conn.close()
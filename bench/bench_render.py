@@ -0,0 +1,113 @@
+# =============================================================================
+# PAGE RENDER BENCHMARK
+# =============================================================================
+# Times the pages a logged-in user loads the most, per route:
+#   request - whole request through the Flask test client (queries + render)
+#   render  - time spent inside render_template (between Flask's
+#             before_render_template and template_rendered signals)
+# plus the HTML size, and the startup cost of compiling every template with
+# and without the Jinja bytecode cache (see init_templates in src/Assets.py).
+#
+# Run from the repository root:
+#   python bench/bench_render.py --requests 500
+# The benchmark works on a throwaway database in a temp folder.
+# =============================================================================
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description="Gallario - template render time per route")
+parser.add_argument("--requests", type=int, default=500, help="Requests timed per route.")
+bench_args = parser.parse_args()
+
+# Point the app at a throwaway database and template cache before anything opens them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+tmp_dir = tempfile.mkdtemp(prefix="gallario-bench-")
+import src.Config as Config
+Config.DB_PATH = os.path.join(tmp_dir, "render.db")
+Config.TEMPLATE_CACHE_FOLDER = os.path.join(tmp_dir, "jinja_cache")
+import src.Helpers as Helpers  # Creates the schema in render.db
+from src.Routing import app, main_bp
+from src.Assets import init_assets, init_templates
+from flask import before_render_template, template_rendered
+
+USERS = 50
+POSTS = 200
+COMMENTS = 60        # On post 1
+NOTIFICATIONS = 300  # For user 1
+
+def seed():
+    """
+    Users, posts, comments on post 1 and a backlog of notifications for user 1.
+    """
+    conn = Helpers.connect_db()
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'x')",
+                     [(f"user{i}",) for i in range(USERS)])
+    conn.executemany("INSERT INTO posts (user_id, image, caption, thumb) VALUES (?, 'img.png', ?, 'thumbs/img.jpg')",
+                     [((i % USERS) + 1, f"caption {i}") for i in range(POSTS)])
+    conn.executemany("INSERT INTO comments (post_id, user_id, text) VALUES (1, ?, ?)",
+                     [((i % USERS) + 1, f"comment {i}") for i in range(COMMENTS)])
+    conn.executemany("INSERT INTO notifications (maker_id, receiver_id, type, reference_id) VALUES (?, 1, ?, 1)",
+                     [((i % (USERS - 1)) + 2, i % 3) for i in range(NOTIFICATIONS)])
+    conn.commit()
+    conn.close()
+
+def time_compile():
+    """
+    Compile every template with an empty in-memory cache.
+    Returns seconds.
+    """
+    app.jinja_env.cache.clear()
+    start = time.perf_counter()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    return time.perf_counter() - start
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+if __name__ == "__main__":
+    seed()
+    app.register_blueprint(main_bp)
+    init_assets()
+
+    # Startup: compiling from source vs loading the bytecode cache
+    shutil.rmtree(Config.TEMPLATE_CACHE_FOLDER, ignore_errors=True)
+    init_templates()  # Fills the bytecode cache
+    app.jinja_env.bytecode_cache = None
+    cold = time_compile()
+    init_templates()
+    warm = time_compile()
+    print(f"compile all templates: {cold * 1000:.1f} ms from source, {warm * 1000:.1f} ms from bytecode cache\n")
+
+    renders = []  # Render durations (a start time while a render is running)
+
+    def render_started(sender, **extra):
+        renders.append(time.perf_counter())
+
+    def render_finished(sender, **extra):
+        renders.append(time.perf_counter() - renders.pop())
+
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+
+    print(f"{'route':<24}{'p50 ms':>10}{'p99 ms':>10}{'render p50':>12}{'render p99':>12}{'html KB':>10}")
+    for route in ("/", "/?sortby=hot", "/post/1", "/profile/user0"):
+        latencies, renders[:] = [], []
+        for _ in range(bench_args.requests):
+            start = time.perf_counter()
+            response = client.get(route)
+            latencies.append((time.perf_counter() - start) * 1000)
+        render_ms = [r * 1000 for r in renders]
+        print(f"{route:<24}{statistics.median(latencies):>10.2f}{percentile(latencies, 0.99):>10.2f}"
+              f"{statistics.median(render_ms):>12.3f}{percentile(render_ms, 0.99):>12.3f}"
+              f"{len(response.data) / 1024:>10.1f}")
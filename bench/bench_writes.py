@@ -0,0 +1,139 @@
+# =============================================================================
+# WRITE THROUGHPUT BENCHMARK
+# =============================================================================
+# Compares the two ways the app has written to SQLite:
+#   direct - every request opens its own connection and commits (rollback journal),
+#            which is how all routes worked before the writer thread
+#   queue  - every request hands its write to the single writer thread (WAL,
+#            group commit) through Helpers.write()
+# Each write is a "like": insert into likes + update the post counters/scores,
+# the same statements the /like route runs.
+#
+# Run from the repository root:
+#   python bench/bench_writes.py --ops 2000 --threads 1 8 64
+# The benchmark works on a throwaway database in a temp folder.
+# =============================================================================
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+parser = argparse.ArgumentParser(description="Gallario - SQLite write throughput, direct connections vs writer queue")
+parser.add_argument("--ops", type=int, default=2000, help="Total writes per run.")
+parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 64], help="Concurrent writer counts to test.")
+bench_args = parser.parse_args()
+
+# Point the app at a throwaway database before anything opens it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+tmp_dir = tempfile.mkdtemp(prefix="gallario-bench-")
+import src.Config as Config
+Config.DB_PATH = os.path.join(tmp_dir, "queue.db")
+import src.Helpers as Helpers  # Creates the schema in queue.db
+
+USERS = 200
+POSTS = 500
+
+def seed(path):
+    """
+    Fill a database with users and posts to react to.
+    """
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'x')",
+                     [(f"user{i}",) for i in range(USERS)])
+    conn.executemany("INSERT INTO posts (user_id, image, caption) VALUES (?, 'img.png', '')",
+                     [((i % USERS) + 1,) for i in range(POSTS)])
+    conn.commit()
+    conn.close()
+
+def like_op(conn, user_id, post_id):
+    """
+    The statements of one like, as run by the /like route.
+    """
+    conn.execute("INSERT OR IGNORE INTO likes (user_id, post_id, value) VALUES (?, ?, 1)", (user_id, post_id))
+    Helpers.update_reaction_stats(conn, post_id, 0, 1)
+
+def make_direct_db():
+    """
+    Copy of the seeded database in rollback-journal mode, like database.db before WAL.
+    """
+    path = os.path.join(tmp_dir, "direct.db")
+    src = sqlite3.connect(Config.DB_PATH)
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    src.close()
+    dst.execute("PRAGMA journal_mode = DELETE")
+    dst.close()
+    return path
+
+def direct_write(path, user_id, post_id):
+    """
+    Old request pattern: connect, write, commit, close.
+    """
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.create_function("hot_score", 2, Helpers.hot_score)
+    try:
+        like_op(conn, user_id, post_id)
+        conn.commit()
+    finally:
+        conn.close()
+
+def queue_write(path, user_id, post_id):
+    """
+    New request pattern: hand the write to the writer thread and wait.
+    """
+    Helpers.write(like_op, user_id, post_id)
+
+def run(write_fn, path, threads, ops, offset):
+    """
+    Run `ops` writes split over `threads` threads.
+    Returns (writes per second, latencies in ms, error count).
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_thread = ops // threads
+
+    def worker(t):
+        mine, failed = [], 0
+        for i in range(per_thread):
+            n = offset + t * per_thread + i
+            user_id, post_id = (n // POSTS) % USERS + 1, n % POSTS + 1
+            start = time.perf_counter()
+            try:
+                write_fn(path, user_id, post_id)
+            except sqlite3.OperationalError:
+                failed += 1  # "database is locked"
+            mine.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(mine)
+            errors.append(failed)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies, sum(errors)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+if __name__ == "__main__":
+    seed(Config.DB_PATH)
+    direct_path = make_direct_db()
+
+    print(f"{'mode':<8}{'writers':>8}{'writes/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    offset = 0
+    for threads in bench_args.threads:
+        for mode, fn, path in (("direct", direct_write, direct_path), ("queue", queue_write, Config.DB_PATH)):
+            rate, latencies, errors = run(fn, path, threads, bench_args.ops, offset)
+            print(f"{mode:<8}{threads:>8}{rate:>12.0f}{statistics.median(latencies):>10.2f}"
+                  f"{percentile(latencies, 0.99):>10.2f}{errors:>8}")
+        offset += bench_args.ops  # Fresh (user, post) pairs for the next run
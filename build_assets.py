@@ -0,0 +1,173 @@
+# =============================================================================
+# Gallario - STATIC ASSET BUILD                                               =
+# =============================================================================
+# Prepares the files in Config.ASSET_FILES for production:
+#   - CSS and JS are minified
+#   - every file is copied to static/dist/ under a name containing a hash of
+#     its content (styles.css -> dist/styles.3fa2c1d04b.css), so browsers can
+#     cache it forever and a new version simply gets a new name
+#   - text files (css, js, fonts) get .gz and .br (if the brotli package is
+#     installed) variants next to them, compressed once at maximum level
+#   - dist/manifest.json maps source names to the built files; src/Assets.py
+#     reads it so url_for('static', ...) and the static route use the builds
+#
+#   python build_assets.py
+#
+# Run it again after editing a static file (in debug mode, edited files are
+# served from source until then). Restart the app to pick up a new manifest.
+# =============================================================================
+import gzip                   # .gz variants
+import hashlib                # Content fingerprints
+import json                   # Manifest
+import os                     # File system operations
+import re                     # Minification
+
+from src.Config import *
+
+try:
+    import brotli             # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+STATIC_FOLDER = os.path.join(BASE_DIR, "static")
+COMPRESSIBLE = {".css", ".js", ".ttf", ".svg"}   # PNG/JPG are already compressed
+
+# =============================================================================
+# MINIFICATION
+# =============================================================================
+
+def minify_css(text):
+    """
+    Remove comments and whitespace that CSS doesn't need.
+    """
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    return text.replace(";}", "}").strip()
+
+def minify_js(text):
+    """
+    Conservative JS minification, safe without a real parser:
+    - drop blank lines, whole-line // comments and /* */ comment blocks
+    - strip indentation
+    Line breaks are kept (automatic semicolon insertion depends on them),
+    and so are multi-line template literals.
+    """
+    out, in_comment, in_template = [], False, False
+    for line in text.splitlines():
+        if in_template:
+            out.append(line)
+        else:
+            line = line.strip()
+            if in_comment or line.startswith("/*"):
+                in_comment = "*/" not in line[2 if line.startswith("/*") else 0:]
+                if in_comment:
+                    continue
+                line = line.split("*/", 1)[1].strip()
+            if not line or line.startswith("//"):
+                continue
+            out.append(line)
+        # An odd number of backticks opens or closes a template literal
+        if line.replace("\\`", "").count("`") % 2:
+            in_template = not in_template
+    return "\n".join(out) + "\n"
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def fingerprint(name, data):
+    """
+    dist/ path of a file: its name with a hash of the built content.
+    """
+    stem, ext = os.path.splitext(name)
+    return f"dist/{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+def rewrite_css_urls(text, manifest):
+    """
+    Point url(...) references to other built assets at their dist/ copies
+    (the stylesheet itself lives in dist/ too).
+    """
+    def replace(match):
+        entry = manifest.get(match.group(2))
+        if entry is None:
+            return match.group(0)
+        return f'url("{os.path.basename(entry["file"])}")'
+    return re.sub(r"""url\((["']?)(?:\./)?([^"')]+)\1\)""", replace, text)
+
+def compress(path, data):
+    """
+    Write the precompressed variants that are smaller than the file.
+    Returns the encodings written, best first.
+    """
+    variants = []
+    if brotli is not None:
+        variants.append(("br", brotli.compress(data, quality=11)))
+    variants.append(("gzip", gzip.compress(data, compresslevel=9, mtime=0)))
+
+    encodings = []
+    for encoding, compressed in variants:
+        if len(compressed) < len(data):
+            with open(path + (".br" if encoding == "br" else ".gz"), "wb") as f:
+                f.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+def previous_files():
+    """
+    Files of the last build. They are kept for one more build so pages
+    rendered before a deploy can still load their assets.
+    """
+    try:
+        with open(ASSET_MANIFEST) as f:
+            return {entry["file"] for entry in json.load(f).values()}
+    except FileNotFoundError:
+        return set()
+
+def build():
+    os.makedirs(ASSET_DIST_FOLDER, exist_ok=True)
+    keep = previous_files()
+    manifest = {}
+    # Stylesheets last so their url(...) can point at the built fonts/images
+    for name in sorted(ASSET_FILES, key=lambda n: n.endswith(".css")):
+        source = os.path.join(STATIC_FOLDER, name)
+        ext = os.path.splitext(name)[1].lower()
+        if ext in MINIFIERS:
+            with open(source, encoding="utf-8") as f:
+                text = MINIFIERS[ext](f.read())
+            if ext == ".css":
+                text = rewrite_css_urls(text, manifest)
+            data = text.encode("utf-8")
+        else:
+            with open(source, "rb") as f:
+                data = f.read()
+
+        built = fingerprint(name, data)
+        path = os.path.join(STATIC_FOLDER, built)
+        with open(path, "wb") as f:
+            f.write(data)
+        encodings = compress(path, data) if ext in COMPRESSIBLE else []
+        manifest[name] = {"file": built, "encodings": encodings, "mtime": os.path.getmtime(source)}
+
+        sizes = "".join(f"{e}={os.path.getsize(path + ('.br' if e == 'br' else '.gz')):>8}" for e in encodings)
+        print(f"{name:<14}{os.path.getsize(source):>8} -> {len(data):>8}  {sizes}  {built}")
+
+    with open(ASSET_MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    # Remove builds older than the previous one
+    keep |= {entry["file"] for entry in manifest.values()}
+    keep = {os.path.basename(f) for f in keep}
+    for entry in os.scandir(ASSET_DIST_FOLDER):
+        base = entry.name.removesuffix(".gz").removesuffix(".br")
+        if entry.name != "manifest.json" and base not in keep:
+            os.remove(entry.path)
+
+    if brotli is None:
+        print("brotli is not installed, only .gz variants were written (pip install brotli).")
+
+if __name__ == "__main__":
+    build()
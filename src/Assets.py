@@ -0,0 +1,100 @@
+import json                   # Reading the build manifest
+import mimetypes              # Content-Type of precompressed files
+import os                     # File system operations
+
+# Flask framework imports
+from flask import request, send_from_directory
+from jinja2 import FileSystemBytecodeCache  # Compiled templates on disk
+
+from src.Config import *
+
+# =============================================================================
+# STATIC ASSETS
+# =============================================================================
+# Serves the output of build_assets.py: url_for('static', filename='styles.css')
+# points to the fingerprinted copy (dist/styles.<hash>.css) listed in the
+# manifest, and requests for those copies get the brotli/gzip variant the
+# browser accepts plus a one year immutable Cache-Control.
+# Without a build, every asset is served from source as before.
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+_manifest = {}      # source name -> {"file": "dist/...", "encodings": [...], "mtime": ...}
+_served = {}        # fingerprinted file -> same entry
+
+def load_manifest():
+    """
+    Read the manifest written by build_assets.py (if there is one).
+    """
+    global _manifest, _served
+    try:
+        with open(ASSET_MANIFEST) as f:
+            _manifest = json.load(f)
+    except FileNotFoundError:
+        _manifest = {}
+    _served = {entry["file"]: entry for entry in _manifest.values()}
+
+def fingerprinted_url(endpoint, values):
+    """
+    url_defaults hook: swap a static filename for its fingerprinted copy.
+    In debug mode, files edited since the last build are served from source.
+    """
+    if endpoint != "static":
+        return
+    name = values.get("filename")
+    entry = _manifest.get(name)
+    if entry is None:
+        return
+    if app.debug and os.path.getmtime(os.path.join(app.static_folder, name)) > entry["mtime"]:
+        return
+    values["filename"] = entry["file"]
+
+def serve_static(filename):
+    """
+    Replacement for Flask's static view.
+    - Fingerprinted files: precompressed variant if accepted, cached for ASSET_MAX_AGE
+    - Anything else (uploads, avatars, unbuilt files): Flask's default handler
+    """
+    entry = _served.get(filename)
+    if entry is None:
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    for encoding in entry["encodings"]:  # Best compression first
+        if request.accept_encodings[encoding] > 0:  # "gzip;q=0" means not acceptable
+            response = send_from_directory(app.static_folder, filename + ENCODING_SUFFIXES[encoding],
+                                           mimetype=mimetype, max_age=ASSET_MAX_AGE)
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+
+    if entry["encodings"]:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.immutable = True  # No revalidation, a new version gets a new name
+    return response
+
+def init_assets():
+    """
+    Load the manifest and install the url_for hook and the static view.
+    """
+    load_manifest()
+    app.url_defaults(fingerprinted_url)
+    app.view_functions["static"] = serve_static
+
+# =============================================================================
+# TEMPLATES
+# =============================================================================
+# Jinja compiles each template to Python code the first time it is rendered.
+# Doing it for every template at startup moves that cost out of the first
+# requests, and the bytecode cache lets the next start skip the compiler
+# (entries are keyed by the template source, so edits invalidate them).
+
+def init_templates():
+    """
+    Install the bytecode cache and compile every template.
+    """
+    os.makedirs(TEMPLATE_CACHE_FOLDER, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_FOLDER)
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
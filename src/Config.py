@@ -14,7 +14,8 @@ from flask import (
 parser = argparse.ArgumentParser(description="Gallario - ImageServer - Social Media Image Sharing Platform")
 parser.add_argument("--port", type=int, default=8080, help="Port number to run on the web app.")
 parser.add_argument("--notlan", action="store_false", default=True, help="Set it to True if you want to test it on other devices that are also connected to the local network.")
-arg = parser.parse_args()
+# parse_known_args so tools and benchmarks can import the config with their own arguments
+arg, _ = parser.parse_known_args()
 
 app = Flask(__name__)
 # Secret key for session management and security
@@ -26,6 +27,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__)+"src")
 # Define folder paths for file storage
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")  # User uploaded images
 AVATAR_FOLDER = os.path.join(BASE_DIR, "static", "avatars")  # User profile pictures
+THUMB_FOLDER = os.path.join(BASE_DIR, "static", "thumbs")    # Small square copies of post images
 
 # Allowed file extensions for security
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
@@ -33,6 +35,69 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 # Create necessary directories if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(AVATAR_FOLDER, exist_ok=True)
+os.makedirs(THUMB_FOLDER, exist_ok=True)
 
 # Database file path
 DB_PATH = os.path.join(BASE_DIR, "database.db")
+
+# Feed ranking ("hot" / "top" sorting on the main page)
+HOT_GRAVITY = 1.8               # How fast hot scores decay with post age
+HOT_WINDOW_DAYS = 7             # Only posts this recent get their hot score refreshed
+HOT_REFRESH_SECONDS = 10 * 60   # How often the decay job runs
+
+# Comments shown per page on a post (more are loaded with "Load more")
+COMMENTS_PER_PAGE = 20
+
+# Notifications
+NOTIFICATIONS_SEEN_MAX_IDS = 500  # Max ids per bulk "mark seen" request
+
+# Profile grid
+PROFILE_POSTS_PER_PAGE = 24  # Posts loaded per page/scroll step on a profile
+THUMB_SIZE = 400             # Thumbnail width and height in pixels
+LQIP_SIZE = 20               # Width of the blurry inline placeholder shown before the image loads
+
+# Deleted/orphaned file cleanup
+FILE_GC_SECONDS = 30              # How often queued file deletions are applied
+RECONCILE_SECONDS = 60 * 60       # How often uploads/avatars/thumbs are swept for orphans
+FILE_GC_BATCH = 400               # Max files handled per run (per folder for the sweep)
+ORPHAN_GRACE_SECONDS = 60 * 60    # Younger files may belong to an upload still in progress
+KEEP_FILES = {"avatars/default.png", "avatars/unknown.png"}  # Shared files never deleted
+
+# Rate limiting for write endpoints: budget name -> (burst size, tokens refilled per second)
+RATE_LIMITS = {
+    "react": (20, 1.0),          # like / dislike
+    "comment": (5, 1 / 12),      # ~5 comments per minute
+    "upload": (3, 1 / 60),       # ~1 upload per minute
+    "profile": (5, 1 / 30),      # avatar / description changes
+    "register": (5, 1 / 300),    # ~1 new account per 5 minutes
+    "delete": (10, 1 / 6),       # post deletions
+    "notifications": (20, 1.0),  # marking notifications as seen
+}
+# "memory" = per process, "sqlite" = shared by every worker on this machine
+RATE_LIMIT_BACKEND = "memory"
+RATE_LIMIT_DB_PATH = os.path.join(BASE_DIR, "ratelimit.db")
+
+# Database connections
+READ_POOL_SIZE = 16     # Idle read-only connections kept for reuse
+WRITE_BATCH_MAX = 64    # Max queued writes committed together by the writer thread
+WRITE_TIMEOUT_SECONDS = 30  # How long write() waits for the writer before giving up
+
+# Near-duplicate (repost) detection with 64-bit perceptual hashes
+DUPLICATE_MAX_DISTANCE = 3    # Max differing bits to call two images the same (< number of hash bands)
+PHASH_MIN_DETAIL_BITS = 5     # Hashes with fewer set (or unset) bits come from flat images: never matched
+PHASH_BACKFILL_SECONDS = 5 * 60  # How often older posts without a hash get one
+PHASH_BACKFILL_BATCH = 200       # Posts hashed per backfill run
+
+# Static asset pipeline (python build_assets.py): minified, fingerprinted and precompressed copies
+ASSET_FILES = ["styles.css", "code.js", "comments.js", "profile.js", "notifications.js", "Biome.ttf", "logo.png"]
+ASSET_DIST_FOLDER = os.path.join(BASE_DIR, "static", "dist")         # Build output, served as /static/dist/...
+ASSET_MANIFEST = os.path.join(ASSET_DIST_FOLDER, "manifest.json")    # Source name -> fingerprinted file
+ASSET_MAX_AGE = 365 * 24 * 60 * 60   # Fingerprinted files never change, let browsers keep them a year
+TEMPLATE_CACHE_FOLDER = os.path.join(BASE_DIR, ".jinja_cache")    # Compiled templates, reused across restarts
+
+# Database maintenance (PRAGMA optimize, incremental vacuum, WAL checkpoints)
+MAINTENANCE_SECONDS = 15 * 60       # How often the maintenance job wakes up
+MAINTENANCE_HOURS = (3, 6)          # Low-traffic window, local hours [start, end)
+MAINTENANCE_BUDGET_SECONDS = 2.0    # Max time spent per run
+VACUUM_STEP_PAGES = 256             # Free pages returned to the OS per write transaction
+CHECKPOINT_BUSY_MS = 250            # Give up a blocking WAL checkpoint after this long
@@ -1,5 +1,11 @@
+import base64                 # Inline placeholder images
+import io                     # In-memory image encoding
 import os                     # File system operations
+import queue                  # Read pool and write queue
 import sqlite3                # Database operations
+import threading              # Writer thread
+import time                   # Writer reconnect delay
+import traceback              # Logging writer failures
 import uuid                   # Generate unique identifiers
 from datetime import datetime # Date/time handling
 
@@ -8,26 +14,204 @@ from flask import session
 
 # Security and file handling imports
 from werkzeug.utils import secure_filename  # Secure file name handling
-from PIL import Image  # Image processing (resize, crop, etc.)
+from PIL import Image, ImageOps  # Image processing (resize, crop, etc.)
 
 from src.Config import *
+from src.Jobs import every
 
 # =============================================================================
 # DATABASE HELPER FUNCTIONS
 # =============================================================================
+# SQLite only allows one writer at a time, so all changes go through a single
+# writer thread (see write() below) while requests read from a pool of
+# read-only connections. The database runs in WAL mode so readers never wait
+# for the writer.
 
-def get_db():
+def connect_db(factory=sqlite3.Connection):
     """
-    Create and return a database connection.
+    Open a new database connection.
     - Enables foreign key constraints for data integrity
     - Sets row factory to return Row objects (like dictionaries)
     - Enables automatic type detection for dates/times
+    Routes should use get_db() to read and write() to change data.
     """
-    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                           factory=factory, check_same_thread=False)
     conn.row_factory = sqlite3.Row  # Return rows as dictionary-like objects
     # Enforce foreign key constraints for data integrity
     conn.execute("PRAGMA foreign_keys = ON")
+    # Make hot_score(score, age_hours) usable inside SQL statements
+    conn.create_function("hot_score", 2, hot_score)
     return conn
+
+# Idle read connections, most recently used first
+_read_pool = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Read-only connection handed out by get_db().
+    close() puts it back in the pool instead of closing it.
+    """
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+        try:
+            _read_pool.put_nowait(self)
+        except queue.Full:
+            super().close()
+
+def get_db():
+    """
+    Return a read-only database connection from the pool.
+    Any INSERT/UPDATE/DELETE on it fails; use write() for changes.
+    Call db.close() when done to give it back to the pool.
+    """
+    try:
+        return _read_pool.get_nowait()
+    except queue.Empty:
+        conn = connect_db(PooledConnection)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+# =============================================================================
+# WRITE QUEUE
+# =============================================================================
+
+_write_queue = queue.Queue()   # Pending _WriteOp objects
+_writer_thread = None          # Started on the first write()
+_writer_conn = None            # The only connection that writes
+_writer_lock = threading.Lock()
+
+class _WriteOp:
+    """
+    One queued write: the function to run and, once done, its result or error.
+    """
+    def __init__(self, fn, args, kwargs):
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.timed_out = False  # The caller stopped waiting, don't run it anymore
+
+def write(fn, *args, **kwargs):
+    """
+    Run fn(conn, *args, **kwargs) on the writer thread and return its result.
+    - fn runs inside a transaction and must not commit itself
+    - Blocks until the transaction holding it is committed
+    - Exceptions raised by fn (e.g. sqlite3.IntegrityError) are re-raised
+      here, and only fn's own changes are rolled back
+    - Raises sqlite3.OperationalError if the writer hasn't applied it after
+      WRITE_TIMEOUT_SECONDS
+    """
+    if threading.current_thread() is _writer_thread:
+        # Already on the writer (a write op calling a helper that writes)
+        return fn(_writer_conn, *args, **kwargs)
+    _start_writer()
+    op = _WriteOp(fn, args, kwargs)
+    _write_queue.put(op)
+    if not op.done.wait(WRITE_TIMEOUT_SECONDS):
+        op.timed_out = True
+        raise sqlite3.OperationalError(f"database write not applied after {WRITE_TIMEOUT_SECONDS}s")
+    if op.error is not None:
+        raise op.error
+    return op.result
+
+def pending_writes():
+    """
+    Number of writes waiting for the writer thread (a cheap load indicator).
+    """
+    return _write_queue.qsize()
+
+def _start_writer():
+    """
+    Start the writer thread (again, if it ever died).
+    """
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="db-writer", daemon=True)
+            _writer_thread.start()
+
+def _writer_loop():
+    """
+    Writer thread: take every write waiting in the queue (up to
+    WRITE_BATCH_MAX) and apply them in one transaction (group commit),
+    so N concurrent writers cost one commit instead of N.
+    If the database can't be opened or the connection is left in a bad
+    state, the batch fails, the error is logged and the next batch
+    reconnects: the thread itself never stops.
+    """
+    global _writer_conn
+    while True:
+        batch = [_write_queue.get()]
+        while len(batch) < WRITE_BATCH_MAX:
+            try:
+                batch.append(_write_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            if _writer_conn is None:
+                _writer_conn = connect_db()
+                _writer_conn.isolation_level = None  # Transactions are managed explicitly below
+            _apply_batch(_writer_conn, batch)
+        except Exception as e:
+            traceback.print_exc()
+            for op in batch:
+                if not op.done.is_set():
+                    op.error = e
+                    op.done.set()
+            _reset_writer_conn()
+            time.sleep(0.1)  # Don't spin if the database stays unavailable
+
+def _reset_writer_conn():
+    """
+    Drop the writer connection so the next batch opens a fresh one.
+    """
+    global _writer_conn
+    if _writer_conn is not None:
+        try:
+            _writer_conn.close()
+        except Exception:
+            pass
+    _writer_conn = None
+
+def _apply_batch(conn, batch):
+    """
+    Apply a batch of writes in a single transaction. Each write runs in its
+    own savepoint, so a failing one is undone without affecting the others.
+    Every op is marked done when this returns, whatever happened; if the
+    transaction can't even be rolled back the error is re-raised so the
+    writer loop replaces the connection.
+    """
+    committed = False
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for op in batch:
+            if op.timed_out:
+                continue
+            conn.execute("SAVEPOINT write_op")
+            try:
+                op.result = op.fn(conn, *op.args, **op.kwargs)
+                conn.execute("RELEASE write_op")
+            except Exception as e:
+                conn.execute("ROLLBACK TO write_op")
+                conn.execute("RELEASE write_op")
+                op.error = e
+        conn.execute("COMMIT")
+        committed = True
+    except Exception as e:
+        # The whole transaction failed (e.g. disk full): nothing was saved
+        for op in batch:
+            if op.error is None:
+                op.error = e
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+    finally:
+        for op in batch:
+            if not committed and op.error is None:
+                op.error = sqlite3.OperationalError("database write was not applied")
+            op.done.set()
+
 def ensure_likes_value_column(conn):
     """
     Database migration helper: Add 'value' column to likes table if missing.
@@ -50,13 +234,180 @@ def ensure_likes_value_column(conn):
             # If ALTER fails (older SQLite or locked DB), ignore gracefully
             pass
 
+def ensure_post_stats_columns(conn):
+    """
+    Database migration helper: Add the denormalized reaction counters and
+    ranking scores to the posts table if missing, then backfill them.
+    - like_count / dislike_count / comment_count are kept up to date by the routes
+    - score = likes - dislikes + comments ("top" sorting)
+    - hot = score decayed by post age ("hot" sorting)
+    """
+    info = conn.execute("PRAGMA table_info(posts)").fetchall()
+    cols = [r["name"] for r in info]
+
+    missing = [c for c in ("like_count", "dislike_count", "comment_count", "score") if c not in cols]
+    for col in missing:
+        conn.execute(f"ALTER TABLE posts ADD COLUMN {col} INTEGER NOT NULL DEFAULT 0")
+    if "hot" not in cols:
+        conn.execute("ALTER TABLE posts ADD COLUMN hot REAL NOT NULL DEFAULT 0")
+
+    # Backfill the counters once for posts that existed before the migration
+    if missing or "hot" not in cols:
+        conn.execute("""
+            UPDATE posts SET
+                like_count    = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id AND likes.value = 1),
+                dislike_count = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id AND likes.value = -1),
+                comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)
+        """)
+        conn.execute("UPDATE posts SET score = like_count - dislike_count + comment_count")
+        conn.execute(f"UPDATE posts SET hot = hot_score(score, {POST_AGE_HOURS_SQL})")
+
+    # Indexes so every feed ordering is an index scan
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_posts_timestamp ON posts(timestamp);
+        CREATE INDEX IF NOT EXISTS idx_posts_hot ON posts(hot);
+        CREATE INDEX IF NOT EXISTS idx_posts_score ON posts(score);
+        CREATE INDEX IF NOT EXISTS idx_likes_post ON likes(post_id, value);
+        CREATE INDEX IF NOT EXISTS idx_comments_post ON comments(post_id);
+    """)
+    conn.commit()
+
+def ensure_post_thumb_column(conn):
+    """
+    Database migration helper: Add the 'thumb' column to posts if missing.
+    Holds the static path of the post's thumbnail (NULL for posts uploaded
+    before thumbnails existed, which fall back to the full image).
+    """
+    info = conn.execute("PRAGMA table_info(posts)").fetchall()
+    cols = [r["name"] for r in info]
+    if "thumb" not in cols:
+        conn.execute("ALTER TABLE posts ADD COLUMN thumb TEXT")
+    # Profile grid pages are range scans of a user's posts by id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_user ON posts(user_id)")
+    conn.commit()
+
+def ensure_post_image_meta_columns(conn):
+    """
+    Database migration helper: Add the image metadata columns to posts if missing.
+    Filled at upload time so pages can reserve the image's space and show a
+    placeholder without downloading it:
+    - width / height = intrinsic size of the image
+    - color = dominant color ("#rrggbb")
+    - lqip = tiny blurry JPEG as a data: URI
+    """
+    info = conn.execute("PRAGMA table_info(posts)").fetchall()
+    cols = [r["name"] for r in info]
+    for col, kind in (("width", "INTEGER"), ("height", "INTEGER"), ("color", "TEXT"), ("lqip", "TEXT")):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE posts ADD COLUMN {col} {kind}")
+    conn.commit()
+
+def ensure_post_phash_columns(conn):
+    """
+    Database migration helper: Add the perceptual hash columns to posts if missing.
+    - phash = 64-bit difference hash of the image (stored signed)
+    - phash0..phash3 = its four 16-bit bands, each indexed (see find_near_duplicate())
+    - duplicate_of = earlier post this one looks like a repost of
+    """
+    info = conn.execute("PRAGMA table_info(posts)").fetchall()
+    cols = [r["name"] for r in info]
+    for col in ("phash", "phash0", "phash1", "phash2", "phash3", "duplicate_of"):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE posts ADD COLUMN {col} INTEGER")
+    for band in range(PHASH_BANDS):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_posts_phash{band} ON posts(phash{band})")
+
+    # Flat images hashed before degenerate hashes were excluded: unlink them
+    # and take their bands (0 / 0xFFFF) out of the index. Such hashes always
+    # have an all-0 or all-1 band, so only those rows need checking.
+    rows = conn.execute("""
+        SELECT id, phash FROM posts
+        WHERE phash0 IN (0, 65535) OR phash1 IN (0, 65535) OR phash2 IN (0, 65535) OR phash3 IN (0, 65535)
+    """).fetchall()
+    conn.executemany(
+        "UPDATE posts SET phash0 = -1, phash1 = -1, phash2 = -1, phash3 = -1, duplicate_of = NULL WHERE id = ?",
+        [(row["id"],) for row in rows if is_degenerate_phash(row["phash"])]
+    )
+    conn.commit()
+
+def ensure_user_stats_table(conn):
+    """
+    Database migration helper: Create the per-user summary table if missing
+    and backfill it from existing posts.
+    - post_count = number of posts of the user
+    - like_count = likes received on all of the user's posts
+    Kept up to date by update_user_stats() / update_post_stats().
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'"
+    ).fetchone()
+    if exists:
+        return
+    conn.executescript("""
+        CREATE TABLE user_stats (
+            user_id INTEGER PRIMARY KEY,
+            post_count INTEGER NOT NULL DEFAULT 0,
+            like_count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        );
+        INSERT INTO user_stats (user_id, post_count, like_count)
+            SELECT user_id, COUNT(*), SUM(like_count) FROM posts
+            WHERE user_id IS NOT NULL GROUP BY user_id;
+    """)
+    conn.commit()
+
+def ensure_file_deletions_table(conn):
+    """
+    Database migration helper: Create the file deletion queue if missing.
+    Routes enqueue files (by static path) in the same transaction that drops
+    their rows; collect_deleted_files() unlinks them after the commit.
+    Also indexes the columns that reference files for the orphan sweep.
+    """
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS file_deletions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL,                -- Path under static/, e.g. uploads/<name>
+            enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_posts_image ON posts(image);
+        CREATE INDEX IF NOT EXISTS idx_posts_thumb ON posts(thumb);
+        CREATE INDEX IF NOT EXISTS idx_users_avatar ON users(avatar);
+        CREATE INDEX IF NOT EXISTS idx_notifications_reference ON notifications(reference_id);
+    """)
+    conn.commit()
+
+def ensure_notifications_receiver_index(conn):
+    """
+    Database migration helper: Index notifications by receiver, seen flag
+    and id, so listing a user's notifications and marking them seen in bulk
+    (everything unseen up to some id) are range scans.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_receiver ON notifications(receiver_id, seen, id)")
+    conn.commit()
+
+def ensure_incremental_vacuum(conn):
+    """
+    Database migration helper: Switch the database to auto_vacuum=INCREMENTAL
+    so pages freed by deletions can be returned to the file system in small
+    steps (PRAGMA incremental_vacuum, see src/Maintenance.py).
+    Existing databases need one full VACUUM to change the mode; it runs once,
+    at startup, and takes as long as copying the file.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # 2 = INCREMENTAL
+        return
+    conn.commit()  # VACUUM can't run inside a transaction
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
 def init_db():
     """
     Initialize the database with all required tables.
     Creates tables for users, posts, likes, comments, notifications, and DMs.
     Also handles database migrations for existing installations.
     """
-    conn = get_db()
+    conn = connect_db()
+    # WAL lets readers run while the writer thread commits (persistent setting)
+    conn.execute("PRAGMA journal_mode = WAL")
     cur = conn.cursor()
     
     # Create all database tables with proper relationships
@@ -92,6 +443,19 @@ def init_db():
         image TEXT,                        -- Filename of uploaded image
         caption TEXT,                      -- Post caption/description
         timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        thumb TEXT,                        -- Thumbnail path (static/thumbs)
+        width INTEGER,                     -- Image size in pixels
+        height INTEGER,
+        color TEXT,                        -- Dominant color, "#rrggbb"
+        lqip TEXT,                         -- Tiny blurry preview (data: URI)
+        phash INTEGER,                     -- Perceptual hash of the image
+        phash0 INTEGER, phash1 INTEGER, phash2 INTEGER, phash3 INTEGER,  -- Its 16-bit bands
+        duplicate_of INTEGER,              -- Earlier post with a near-identical image
+        like_count INTEGER NOT NULL DEFAULT 0,     -- Denormalized reaction counters
+        dislike_count INTEGER NOT NULL DEFAULT 0,
+        comment_count INTEGER NOT NULL DEFAULT 0,
+        score INTEGER NOT NULL DEFAULT 0,          -- likes - dislikes + comments ("top")
+        hot REAL NOT NULL DEFAULT 0,               -- Time-decayed score ("hot")
         FOREIGN KEY(user_id) REFERENCES users(id)
     );
 
@@ -132,9 +496,360 @@ def init_db():
     
     # Ensure likes.value column exists (for database migrations)
     ensure_likes_value_column(conn)
+    # Ensure posts have their counters and ranking scores
+    ensure_post_stats_columns(conn)
+    # Ensure thumbnails and per-user summaries for the profile grid
+    ensure_post_thumb_column(conn)
+    ensure_user_stats_table(conn)
+    # Ensure size/placeholder columns used to render images before they load
+    ensure_post_image_meta_columns(conn)
+    # Ensure the perceptual hash index used to spot reposts
+    ensure_post_phash_columns(conn)
+    # Ensure the queue of files to delete after commit
+    ensure_file_deletions_table(conn)
+    # Ensure the index behind the notification list and bulk "mark seen"
+    ensure_notifications_receiver_index(conn)
+    # Ensure freed pages can be reclaimed by the maintenance job
+    ensure_incremental_vacuum(conn)
     conn.commit()
     conn.close()
 
+# =============================================================================
+# FEED RANKING HELPERS
+# =============================================================================
+
+# Age of a post in hours, computed by SQLite (timestamps are stored in UTC)
+POST_AGE_HOURS_SQL = "(julianday('now') - julianday(posts.timestamp)) * 24"
+
+def hot_score(score, age_hours):
+    """
+    Time-decayed ranking score (Hacker News style):
+        score / (age_hours + 2) ^ HOT_GRAVITY
+    New posts with a few reactions beat old posts with many.
+    """
+    score = score or 0
+    age_hours = max(age_hours or 0, 0)
+    return score / pow(age_hours + 2, HOT_GRAVITY)
+
+def update_post_stats(conn, post_id, likes=0, dislikes=0, comments=0):
+    """
+    Apply reaction count changes to a post and refresh its scores in one UPDATE.
+    Called by the like/dislike/comment routes inside their transaction,
+    so the ranked feed never has to count reactions per request.
+    """
+    conn.execute(f"""
+        UPDATE posts SET
+            like_count    = like_count + :likes,
+            dislike_count = dislike_count + :dislikes,
+            comment_count = comment_count + :comments,
+            score = score + :likes - :dislikes + :comments,
+            hot = hot_score(score + :likes - :dislikes + :comments, {POST_AGE_HOURS_SQL})
+        WHERE id = :post_id
+    """, {"likes": likes, "dislikes": dislikes, "comments": comments, "post_id": post_id})
+    if likes:
+        # Keep the owner's profile total in sync
+        owner = conn.execute("SELECT user_id FROM posts WHERE id = ?", (post_id,)).fetchone()
+        if owner:
+            update_user_stats(conn, owner["user_id"], likes=likes)
+
+def update_user_stats(conn, user_id, posts=0, likes=0):
+    """
+    Apply changes to a user's cached post/like totals (profile header).
+    Creates the summary row on first use.
+    """
+    conn.execute("""
+        INSERT INTO user_stats (user_id, post_count, like_count) VALUES (:user_id, :posts, :likes)
+        ON CONFLICT(user_id) DO UPDATE SET
+            post_count = post_count + :posts,
+            like_count = like_count + :likes
+    """, {"user_id": user_id, "posts": posts, "likes": likes})
+
+def update_reaction_stats(conn, post_id, old_value, new_value):
+    """
+    Update a post's counters after a user's reaction changed
+    from old_value to new_value (1=like, -1=dislike, 0=none).
+    """
+    update_post_stats(
+        conn, post_id,
+        likes=int(new_value == 1) - int(old_value == 1),
+        dislikes=int(new_value == -1) - int(old_value == -1),
+    )
+
+@every(HOT_REFRESH_SECONDS)
+def refresh_hot_scores():
+    """
+    Periodic decay job: recompute hot scores of recent posts so they sink
+    as they age even without new reactions. Older posts keep their last
+    (already tiny) score until they get a new reaction.
+    """
+    write(lambda conn: conn.execute(f"""
+        UPDATE posts SET hot = hot_score(score, {POST_AGE_HOURS_SQL})
+        WHERE timestamp >= datetime('now', ?)
+    """, (f"-{HOT_WINDOW_DAYS} days",)))
+
+# =============================================================================
+# COMMENT PAGINATION
+# =============================================================================
+
+def get_comments_page(conn, post_id, order="oldest", cursor=None, limit=COMMENTS_PER_PAGE):
+    """
+    Get one page of a post's comments with their author info.
+    Uses cursor (keyset) pagination on comments.id so every page is a
+    short range scan of idx_comments_post, however long the thread is.
+    - order: "oldest" or "newest" first
+    - cursor: id of the last comment already shown (None for the first page)
+    Returns (comments, next_cursor); next_cursor is None on the last page.
+    """
+    newest = order == "newest"
+    params = [post_id]
+    after_cursor = ""
+    if cursor is not None:
+        after_cursor = f"AND comments.id {'<' if newest else '>'} ?"
+        params.append(cursor)
+    params.append(limit + 1)  # One extra row tells us if there is a next page
+
+    rows = conn.execute(f"""
+        SELECT comments.id, comments.text, comments.timestamp, comments.user_id,
+               users.username, users.avatar
+        FROM comments JOIN users ON comments.user_id = users.id
+        WHERE comments.post_id = ? {after_cursor}
+        ORDER BY comments.id {'DESC' if newest else 'ASC'}
+        LIMIT ?
+    """, params).fetchall()
+
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]["id"]
+    return rows, None
+
+# =============================================================================
+# PROFILE GRID PAGINATION
+# =============================================================================
+
+def get_profile_posts_page(conn, user_id, cursor=None, limit=PROFILE_POSTS_PER_PAGE):
+    """
+    Get one page of a user's posts for the profile grid, newest first.
+    Only selects what the grid needs (id and thumbnail) and uses cursor
+    pagination on posts.id over idx_posts_user.
+    - cursor: id of the last post already shown (None for the first page)
+    Returns (posts, next_cursor); next_cursor is None on the last page.
+    """
+    params = [user_id]
+    before_cursor = ""
+    if cursor is not None:
+        before_cursor = "AND id < ?"
+        params.append(cursor)
+    params.append(limit + 1)  # One extra row tells us if there is a next page
+
+    rows = conn.execute(f"""
+        SELECT id, COALESCE(thumb, 'uploads/' || image) AS thumb, color
+        FROM posts
+        WHERE user_id = ? {before_cursor}
+        ORDER BY id DESC
+        LIMIT ?
+    """, params).fetchall()
+
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]["id"]
+    return rows, None
+
+# =============================================================================
+# DUPLICATE IMAGE DETECTION
+# =============================================================================
+# Reposts are found with a 64-bit difference hash (dHash), which survives
+# resizing and recompression. Lookups use multi-index hashing: the hash is
+# split into PHASH_BANDS bands of 16 bits, each stored in an indexed column.
+# Two hashes at most DUPLICATE_MAX_DISTANCE (< PHASH_BANDS) bits apart must
+# share at least one band exactly, so only posts matching one of the four
+# band values need an exact Hamming distance check.
+
+PHASH_BANDS = 4
+
+def is_degenerate_phash(phash):
+    """
+    Whether a hash (signed or unsigned) carries too little detail to compare:
+    flat or smooth images (solid colors, plain gradients) all hash to nearly
+    0 or nearly all ones, so they would all "match" each other.
+    """
+    bits = bin(phash & 0xFFFFFFFFFFFFFFFF).count("1")
+    return bits < PHASH_MIN_DETAIL_BITS or bits > 64 - PHASH_MIN_DETAIL_BITS
+
+def phash_columns(phash):
+    """
+    Return the values stored for an unsigned 64-bit hash:
+    (signed phash, band 0, band 1, band 2, band 3).
+    SQLite integers are signed, so the top half of the range wraps around.
+    Degenerate hashes get bands of -1, which are never looked up.
+    """
+    signed = phash - (1 << 64) if phash >= (1 << 63) else phash
+    if is_degenerate_phash(phash):
+        return (signed,) + (-1,) * PHASH_BANDS
+    return (signed,) + tuple((phash >> (16 * band)) & 0xFFFF for band in range(PHASH_BANDS))
+
+def hamming_distance(a, b):
+    """
+    Number of differing bits between two hashes (signed or unsigned).
+    """
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+def find_near_duplicate(conn, phash):
+    """
+    Return the id of the oldest post whose image hash is within
+    DUPLICATE_MAX_DISTANCE bits of `phash` (unsigned), or None.
+    Degenerate hashes (flat images) are never matched.
+    """
+    if is_degenerate_phash(phash):
+        return None
+    signed, *bands = phash_columns(phash)
+    rows = conn.execute("""
+        SELECT id, phash FROM posts
+        WHERE phash0 = ? OR phash1 = ? OR phash2 = ? OR phash3 = ?
+        ORDER BY id
+    """, bands).fetchall()
+    for row in rows:
+        if hamming_distance(row["phash"], signed) <= DUPLICATE_MAX_DISTANCE:
+            return row["id"]
+    return None
+
+@every(PHASH_BACKFILL_SECONDS)
+def backfill_phashes(limit=PHASH_BACKFILL_BATCH):
+    """
+    Background job: hash up to `limit` posts uploaded before hashing existed,
+    so they can be matched too. Posts whose image can't be read are stored
+    with bands of -1, which never match, so they aren't retried forever.
+    Returns how many posts were processed.
+    """
+    db = get_db()
+    rows = db.execute("SELECT id, image FROM posts WHERE phash IS NULL ORDER BY id LIMIT ?", (limit,)).fetchall()
+    db.close()
+    if not rows:
+        return 0  # Backfill is finished
+    updates = []
+    for row in rows:
+        phash = image_dhash(row["image"])
+        values = phash_columns(phash) if phash is not None else (0, -1, -1, -1, -1)
+        updates.append(values + (row["id"],))
+    write(lambda conn: conn.executemany(
+        "UPDATE posts SET phash = ?, phash0 = ?, phash1 = ?, phash2 = ?, phash3 = ? WHERE id = ?", updates
+    ))
+    return len(updates)
+
+# =============================================================================
+# FILE GARBAGE COLLECTION
+# =============================================================================
+# Files are never unlinked inside a request: routes enqueue them in the same
+# transaction that removes the rows pointing at them, and the jobs below
+# delete them once that transaction is committed. A crash at any point
+# leaves at worst an unreferenced file, which the orphan sweep picks up.
+
+MEDIA_FOLDERS = ("uploads", "avatars", "thumbs")  # Folders under static/ the collector may delete from
+
+def media_path(value):
+    """
+    Normalize a file reference stored in the database to "<folder>/<name>"
+    with folder one of MEDIA_FOLDERS. Older rows use forms like
+    "./avatars/x.png" or "/static/avatars/x.png". Returns None for anything
+    else (other folders, nested paths, "..").
+    """
+    value = (value or "").replace("\\", "/")
+    for prefix in ("/static/", "./"):
+        if value.startswith(prefix):
+            value = value[len(prefix):]
+    parts = value.split("/")
+    if len(parts) != 2 or parts[0] not in MEDIA_FOLDERS or parts[1] in ("", ".", ".."):
+        return None
+    return value
+
+def enqueue_file_deletion(conn, *paths):
+    """
+    Queue files (paths under static/) for deletion. Must be called inside
+    the transaction that stops referencing them; nothing happens on rollback.
+    Paths outside the media folders and shared files (KEEP_FILES) are ignored.
+    """
+    paths = [media_path(p) for p in paths]
+    conn.executemany(
+        "INSERT INTO file_deletions (path) VALUES (?)",
+        [(p,) for p in paths if p and p not in KEEP_FILES]
+    )
+
+@every(FILE_GC_SECONDS)
+def collect_deleted_files(limit=FILE_GC_BATCH):
+    """
+    Background collector: unlink up to `limit` queued files and drop
+    them from the queue. Returns how many entries were processed.
+    """
+    db = get_db()
+    rows = db.execute("SELECT id, path FROM file_deletions ORDER BY id LIMIT ?", (limit,)).fetchall()
+    db.close()
+    if not rows:
+        return 0
+    for row in rows:
+        path = media_path(row["path"])  # Entries queued before paths were checked
+        if path and path not in KEEP_FILES:
+            remove_static_file(path)
+    write(lambda conn: conn.executemany("DELETE FROM file_deletions WHERE id = ?", [(row["id"],) for row in rows]))
+    return len(rows)
+
+# Last file name checked in each folder, so every sweep continues where the
+# previous one stopped instead of re-listing the same first batch
+_reconcile_cursors = {}
+
+def referenced_files(conn, folder, names):
+    """
+    Return the subset of `names` (files in static/<folder>) that a row still points to.
+    - uploads: posts.image holds the bare file name
+    - thumbs:  posts.thumb holds "thumbs/<name>"
+    - avatars: users.avatar holds "avatars/<name>" (or "./avatars/<name>", "/static/avatars/<name>")
+    """
+    marks = ",".join("?" * len(names))
+    if folder == "uploads":
+        rows = conn.execute(f"SELECT image FROM posts WHERE image IN ({marks})", names)
+    elif folder == "thumbs":
+        rows = conn.execute(f"SELECT thumb FROM posts WHERE thumb IN ({marks})", [f"thumbs/{n}" for n in names])
+    else:
+        paths = [f"{prefix}avatars/{n}" for prefix in ("", "./", "/static/") for n in names]
+        rows = conn.execute(f"SELECT avatar FROM users WHERE avatar IN ({marks},{marks},{marks})", paths)
+    return {os.path.basename(r[0]) for r in rows}
+
+@every(RECONCILE_SECONDS)
+def reconcile_orphaned_files(limit=FILE_GC_BATCH):
+    """
+    Periodic sweep: enqueue files in static/uploads, static/avatars and
+    static/thumbs that no row references (e.g. an upload whose post insert
+    never happened, or avatars replaced before deletions were queued).
+    Checks at most `limit` files per folder per run and skips files younger
+    than ORPHAN_GRACE_SECONDS. Returns how many files were enqueued.
+    """
+    cutoff = datetime.now().timestamp() - ORPHAN_GRACE_SECONDS
+    enqueued = 0
+    for folder in MEDIA_FOLDERS:
+        directory = os.path.join(BASE_DIR, "static", folder)
+        start = _reconcile_cursors.get(folder, "")
+        names = sorted(n for n in os.listdir(directory) if n > start)[:limit]
+        # Wrap around to the beginning once the whole folder was covered
+        _reconcile_cursors[folder] = names[-1] if len(names) == limit else ""
+
+        candidates = [
+            n for n in names
+            if f"{folder}/{n}" not in KEEP_FILES
+            and os.path.isfile(os.path.join(directory, n))
+            and os.path.getmtime(os.path.join(directory, n)) < cutoff
+        ]
+        if not candidates:
+            continue
+        enqueued += write(enqueue_orphans, folder, candidates)
+    return enqueued
+
+def enqueue_orphans(conn, folder, names):
+    """
+    Write op for reconcile_orphaned_files(): queue the files among `names`
+    that nothing references. Checking and queueing in the same transaction
+    means a file can't become referenced in between.
+    """
+    used = referenced_files(conn, folder, names)
+    orphans = [f"{folder}/{n}" for n in names if n not in used]
+    enqueue_file_deletion(conn, *orphans)
+    return len(orphans)
+
 # Initialize the database when the app starts
 init_db()
 
@@ -236,13 +951,95 @@ def save_upload_file(file_storage):
     file_storage.save(full_path)
     return unique
 
-def remove_upload_file(stored_filename):
+ORIENTATION_TAG = 0x0112  # EXIF orientation
+
+def image_dhash(stored_filename):
+    """
+    Compute the 64-bit difference hash (dHash) of an uploaded image:
+    shrink to 9x8 grayscale and set one bit per pixel that is brighter
+    than its right neighbour. Returns an unsigned int, or None if the
+    image can't be read.
+    """
+    try:
+        img = Image.open(os.path.join(UPLOAD_FOLDER, stored_filename))
+        img.draft("L", (64, 64))  # Fast reduced decoding for JPEGs
+        pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    phash = 0
+    for row in range(8):
+        for col in range(8):
+            left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+            phash = (phash << 1) | (left > right)
+    return phash
+
+def save_thumbnail(stored_filename):
+    """
+    Create the square thumbnail of an uploaded post image.
+    - Crops to a centered square
+    - Resizes to THUMB_SIZE x THUMB_SIZE
+    - Saves as JPEG in the thumbs folder
+    Returns relative path for database storage, or None if the image can't be read.
+    """
+    thumb_name = f"{os.path.splitext(stored_filename)[0]}.jpg"
+    try:
+        img = Image.open(os.path.join(UPLOAD_FOLDER, stored_filename))
+        img.draft("RGB", (THUMB_SIZE, THUMB_SIZE))  # Reduced JPEG decoding, still >= THUMB_SIZE
+        img = img.convert("RGB")  # First frame for GIFs, no transparency
+        img = crop_to_square(img)
+        img = img.resize((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+        img.save(os.path.join(THUMB_FOLDER, thumb_name), format="JPEG", quality=80, optimize=True)
+    except Exception:
+        return None
+    return f"thumbs/{thumb_name}"
+
+def image_placeholder(stored_filename):
+    """
+    Compute what pages need to lay out an uploaded image before it loads.
+    Returns a dict with width, height, color ("#rrggbb") and lqip
+    (a LQIP_SIZE px wide JPEG as a data: URI), or None if the image can't be read.
+    """
+    try:
+        img = Image.open(os.path.join(UPLOAD_FOLDER, stored_filename))
+        # Size as displayed: browsers apply the EXIF rotation, and
+        # orientations 5-8 turn the image by 90 degrees
+        width, height = img.size
+        if img.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8):
+            width, height = height, width
+
+        # JPEGs can be decoded at a fraction of their size, much faster.
+        # draft() only works before the pixels are loaded, so rotate after it
+        img.draft("RGB", (LQIP_SIZE * 4, LQIP_SIZE * 4))
+        small = ImageOps.exif_transpose(img).convert("RGB")
+        small.thumbnail((LQIP_SIZE, LQIP_SIZE * 4))
+
+        # Dominant color = most common color of a 5 color palette
+        palette_img = small.quantize(colors=5)
+        count, index = max(palette_img.getcolors())
+        r, g, b = palette_img.getpalette()[index * 3:index * 3 + 3]
+
+        buf = io.BytesIO()
+        small.save(buf, format="JPEG", quality=50)
+    except Exception:
+        return None
+    return {
+        "width": width,
+        "height": height,
+        "color": f"#{r:02x}{g:02x}{b:02x}",
+        "lqip": "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii"),
+    }
+
+def remove_static_file(relative_path):
     """
-    Safely delete an uploaded file from the filesystem.
-    Used when posts are deleted to clean up storage.
+    Safely delete a file stored under static/ by its database path
+    (e.g. "thumbs/<name>.jpg" or "avatars/<name>.png").
+    Refuses paths that resolve outside the static folder.
     """
     try:
-        path = os.path.join(UPLOAD_FOLDER, stored_filename)
+        static_dir = os.path.realpath(os.path.join(BASE_DIR, "static"))
+        path = os.path.realpath(os.path.join(static_dir, relative_path))
+        if os.path.commonpath([static_dir, path]) != static_dir or path == static_dir:
+            return False
         if os.path.exists(path):
             os.remove(path)
             return True
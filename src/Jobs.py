@@ -0,0 +1,47 @@
+import threading              # Background worker threads
+import time                   # Sleeping between runs
+import traceback              # Logging job failures
+
+# =============================================================================
+# BACKGROUND JOBS
+# =============================================================================
+# Small periodic scheduler for maintenance work that should not run inside a
+# request (score decay, cleanups...). Jobs register themselves with @every and
+# are started once by app.py.
+
+_jobs = []          # (interval in seconds, function) pairs
+_started = False    # start_jobs() only spawns the threads once
+
+def every(seconds):
+    """
+    Decorator: register a function to be run every `seconds` seconds
+    in its own daemon thread once start_jobs() is called.
+    """
+    def register(fn):
+        _jobs.append((seconds, fn))
+        return fn
+    return register
+
+def _run_forever(seconds, fn):
+    """
+    Worker loop for one job. A failing run is logged and the job
+    keeps going on its next tick.
+    """
+    while True:
+        time.sleep(seconds)
+        try:
+            fn()
+        except Exception:
+            traceback.print_exc()
+
+def start_jobs():
+    """
+    Start every registered job in a daemon thread.
+    Safe to call more than once.
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+    for seconds, fn in _jobs:
+        threading.Thread(target=_run_forever, args=(seconds, fn), name=fn.__name__, daemon=True).start()
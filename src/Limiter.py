@@ -0,0 +1,158 @@
+import sqlite3                # Shared bucket storage
+import threading              # Lock for the in-memory buckets
+from collections import OrderedDict  # Least recently used buckets first
+import time                   # Token refill clock
+from functools import wraps   # Keep route function names for Flask
+
+# Flask framework imports
+from flask import request, session, jsonify, flash, redirect, url_for
+
+from src.Config import *
+from src import Metrics
+
+# =============================================================================
+# RATE LIMITING
+# =============================================================================
+# Token buckets per (budget, client). Every write request costs one token;
+# a client without tokens gets 429 + Retry-After instead of another SQLite
+# write transaction (form posts get a flashed message and are sent back to
+# the page they came from). Budgets are defined in Config.RATE_LIMITS.
+
+def refill_wait(tokens, rate):
+    """
+    Seconds until a bucket holding `tokens` has one whole token (0 if it has).
+    """
+    return 0 if tokens >= 1 else (1 - tokens) / rate
+
+class MemoryBuckets:
+    """
+    Buckets kept in this process. Each worker process has its own,
+    so with N workers a client effectively gets N times the budget.
+    """
+    MAX_KEYS = 100_000  # Forget the least recently seen clients past this many buckets
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, last refill time), least recently used first
+
+    def take(self, keys, capacity, rate):
+        """
+        Take one token from each bucket in `keys`, only if every one of
+        them has a token (a refused request costs nothing).
+        Returns 0 if allowed, otherwise the seconds until all have a token.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = {}
+            for key in keys:
+                tokens, updated = self._buckets.pop(key, (capacity, now))  # Re-inserted last (most recent)
+                levels[key] = min(capacity, tokens + (now - updated) * rate)
+            wait = max(refill_wait(tokens, rate) for tokens in levels.values())
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens if wait else tokens - 1, now)
+            while len(self._buckets) > self.MAX_KEYS:
+                # Only the longest idle clients lose their state, never the caller
+                self._buckets.popitem(last=False)
+        return wait
+
+class SqliteBuckets:
+    """
+    Buckets stored in their own small SQLite file (RATE_LIMIT_DB_PATH) so
+    every worker on the machine shares them. It is a separate database from
+    database.db, so limiter writes never wait on the app's write lock.
+    Buckets that have refilled completely are pruned every PRUNE_SECONDS:
+    a missing bucket is the same as a full one.
+    """
+    PRUNE_SECONDS = 60
+
+    def __init__(self, path):
+        self.path = path
+        self._next_prune = 0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,       -- budget:client
+                tokens REAL NOT NULL,       -- Tokens left
+                updated REAL NOT NULL,      -- Last refill (unix time)
+                full_at REAL NOT NULL DEFAULT 0  -- When the bucket is back to capacity
+            )
+        """)
+        # Migration for bucket files created before pruning
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(buckets)")]
+        if "full_at" not in columns:
+            conn.execute("ALTER TABLE buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_full_at ON buckets(full_at)")
+        conn.close()
+
+    def _connect(self):
+        # Autocommit mode, transactions are opened explicitly
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def take(self, keys, capacity, rate):
+        """
+        Same contract as MemoryBuckets.take(), atomic across processes.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            levels = {}
+            for key in keys:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                levels[key] = min(capacity, tokens + max(now - updated, 0) * rate)
+            wait = max(refill_wait(tokens, rate) for tokens in levels.values())
+            for key, tokens in levels.items():
+                if not wait:
+                    tokens -= 1
+                conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                             (key, tokens, now, now + (capacity - tokens) / rate))
+            if now >= self._next_prune:
+                self._next_prune = now + self.PRUNE_SECONDS
+                conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return wait
+
+# The backend used by rate_limit(), chosen by Config.RATE_LIMIT_BACKEND
+buckets = SqliteBuckets(RATE_LIMIT_DB_PATH) if RATE_LIMIT_BACKEND == "sqlite" else MemoryBuckets()
+
+def rate_limit(budget, form=False):
+    """
+    Route decorator: charge one token of `budget` to both the logged-in
+    user and the client IP. GET requests (e.g. showing a form) are free.
+    When either bucket is empty:
+    - JSON endpoints get 429 with Retry-After
+    - form posts (`form=True`) get a flashed error and a redirect back to
+      the previous page, also with Retry-After
+    Counts allowed/limited requests in the metrics.
+    """
+    capacity, rate = RATE_LIMITS[budget]
+
+    def decorator(view):
+        @wraps(view)
+        def limited(*args, **kwargs):
+            if request.method in ("GET", "HEAD"):
+                return view(*args, **kwargs)
+            keys = [f"{budget}:ip:{request.remote_addr}"]
+            if session.get("user_id"):
+                keys.append(f"{budget}:user:{session['user_id']}")
+            wait = buckets.take(keys, capacity, rate)
+
+            if wait:
+                Metrics.incr(f"ratelimit.{budget}.limited")
+                if form:
+                    flash(f"Too many requests, try again in {int(wait) + 1} seconds.", "error")
+                    response = redirect(request.referrer or url_for("main.index"))
+                else:
+                    response = jsonify(success=False, error="Too many requests, slow down.")
+                    response.status_code = 429
+                response.headers["Retry-After"] = str(int(wait) + 1)
+                return response
+
+            Metrics.incr(f"ratelimit.{budget}.allowed")
+            return view(*args, **kwargs)
+        return limited
+    return decorator
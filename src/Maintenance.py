@@ -0,0 +1,118 @@
+import os                     # Database/WAL file sizes
+import time                   # Time budget
+from datetime import datetime # Low-traffic window
+
+from src.Config import *
+from src.Helpers import connect_db, get_db, write, pending_writes
+from src.Jobs import every
+from src import Metrics
+
+# =============================================================================
+# DATABASE MAINTENANCE
+# =============================================================================
+# Deleting posts, comments and notifications leaves free pages in database.db
+# and the planner statistics go stale as tables grow. During the low-traffic
+# window (Config.MAINTENANCE_HOURS) the job below:
+#   1. refreshes statistics with PRAGMA optimize (bounded by analysis_limit)
+#   2. returns free pages to the OS with PRAGMA incremental_vacuum, in steps
+#      of VACUUM_STEP_PAGES queued behind normal writes
+#   3. checkpoints the WAL and truncates it
+# Every run stops at MAINTENANCE_BUDGET_SECONDS, and vacuuming stops as soon
+# as requests are waiting to write, so it never holds the database for long.
+
+ANALYSIS_LIMIT = 400  # Rows sampled per index by PRAGMA optimize
+
+def in_maintenance_window(now=None):
+    """
+    Whether `now` (default: current local time) falls in MAINTENANCE_HOURS.
+    The window may wrap around midnight, e.g. (23, 2).
+    """
+    start, end = MAINTENANCE_HOURS
+    hour = (now or datetime.now()).hour
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+def optimize(conn):
+    """
+    Write op: refresh planner statistics of tables that need it.
+    """
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    conn.execute("PRAGMA optimize")
+
+def vacuum_step(conn, pages):
+    """
+    Write op: return up to `pages` free pages to the OS. Returns how many were freed.
+    """
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    for _ in range(min(pages, before)):
+        # sqlite3 steps a statement without result columns only once, and
+        # incremental_vacuum frees one page per step: run it once per page
+        conn.execute("PRAGMA incremental_vacuum(1)")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def checkpoint():
+    """
+    Copy the WAL into the database without blocking anyone (PASSIVE), then
+    try to finish and truncate it (TRUNCATE), which has to wait for the
+    writer: give up after CHECKPOINT_BUSY_MS rather than stall requests.
+    Returns True if the WAL was truncated.
+    """
+    conn = connect_db()
+    conn.isolation_level = None
+    try:
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        conn.execute(f"PRAGMA busy_timeout = {CHECKPOINT_BUSY_MS}")
+        busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        return not busy
+    finally:
+        conn.close()
+
+@every(MAINTENANCE_SECONDS)
+def run_maintenance(force=False):
+    """
+    Periodic maintenance job, only does something inside the low-traffic
+    window unless `force` is set. Returns what was done.
+    """
+    if not force and not in_maintenance_window():
+        return None
+    deadline = time.monotonic() + MAINTENANCE_BUDGET_SECONDS
+    done = {"optimized": False, "vacuumed_pages": 0, "checkpointed": False}
+
+    write(optimize)
+    done["optimized"] = True
+
+    while time.monotonic() < deadline and pending_writes() == 0:
+        freed = write(vacuum_step, VACUUM_STEP_PAGES)
+        done["vacuumed_pages"] += freed
+        if freed < VACUUM_STEP_PAGES:
+            break  # Freelist is empty
+
+    if time.monotonic() < deadline:
+        done["checkpointed"] = checkpoint()
+
+    Metrics.incr("maintenance.runs")
+    Metrics.incr("maintenance.vacuumed_pages", done["vacuumed_pages"])
+    Metrics.incr("maintenance.checkpoints" if done["checkpointed"] else "maintenance.checkpoints_skipped")
+    return done
+
+# =============================================================================
+# DATABASE GAUGES
+# =============================================================================
+
+def _pragma(name):
+    db = get_db()
+    try:
+        return db.execute(f"PRAGMA {name}").fetchone()[0]
+    finally:
+        db.close()
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+Metrics.gauge("db.size_bytes")(lambda: _file_size(DB_PATH))
+Metrics.gauge("db.wal_bytes")(lambda: _file_size(DB_PATH + "-wal"))
+Metrics.gauge("db.page_count")(lambda: _pragma("page_count"))
+Metrics.gauge("db.freelist_pages")(lambda: _pragma("freelist_count"))
+Metrics.gauge("db.pending_writes")(pending_writes)
@@ -0,0 +1,41 @@
+import threading              # Counters are updated from request threads
+
+# =============================================================================
+# METRICS
+# =============================================================================
+# In-process counters and gauges, exposed as JSON by the /metrics route.
+
+_lock = threading.Lock()
+_counters = {}      # name -> int
+_gauges = {}        # name -> function returning the current value
+
+def incr(name, amount=1):
+    """
+    Increase a counter (created at 0 on first use).
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def gauge(name):
+    """
+    Decorator: register a function whose return value is reported
+    as `name` every time metrics are read.
+    """
+    def register(fn):
+        _gauges[name] = fn
+        return fn
+    return register
+
+def snapshot():
+    """
+    Return all counters and the current value of every gauge.
+    A failing gauge is reported as None instead of breaking the endpoint.
+    """
+    with _lock:
+        data = dict(_counters)
+    for name, fn in _gauges.items():
+        try:
+            data[name] = fn()
+        except Exception:
+            data[name] = None
+    return data
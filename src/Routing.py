@@ -14,6 +14,8 @@ from PIL import Image  # Image processing (resize, crop, etc.)
  
 from src.Config import *
 from src.Helpers import *
+from src.Limiter import rate_limit
+from src import Metrics
 
 
 # =============================================================================
@@ -22,6 +24,13 @@ from src.Helpers import *
 
 main_bp = Blueprint("main", __name__, url_prefix="")
 
+# ORDER BY clauses for the feed's ?sortby= values (each one is backed by an index)
+FEED_ORDERINGS = {
+    "time": "posts.timestamp DESC",            # Newest first
+    "hot": "posts.hot DESC, posts.id DESC",    # Time-decayed score
+    "top": "posts.score DESC, posts.id DESC",  # All-time score
+}
+
 @main_bp.route("/")
 def index():
     """
@@ -32,6 +41,8 @@ def index():
     user_id = session.get("user_id")
     #Sort by arg
     sortby = request.args.get("sortby", "time")
+    if sortby not in FEED_ORDERINGS:
+        sortby = "time"
     accending = int(request.args.get("accending", 1))
 
     # Pagination setup
@@ -39,26 +50,23 @@ def index():
     per_page = 5  # Posts per page
     offset = (page - 1) * per_page
 
-    # Complex query to get posts with all related data
-    posts = db.execute("""
+    # Counts and scores are stored on the posts row, so every ordering
+    # is a plain index scan instead of counting reactions per post
+    posts = db.execute(f"""
         SELECT posts.id, posts.image, posts.caption, posts.timestamp, posts.user_id,
+               posts.width, posts.height, posts.color, posts.lqip,
                users.username, users.avatar,
-               -- Count likes (value = 1)
-               COALESCE((SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id AND likes.value = 1),0) AS like_count,
-               -- Count dislikes (value = -1)
-               COALESCE((SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id AND likes.value = -1),0) AS dislike_count,
+               posts.like_count, posts.dislike_count, posts.comment_count,
                -- Get current user's vote on this post
-               COALESCE((SELECT value FROM likes WHERE likes.post_id = posts.id AND likes.user_id = ?), 0) AS user_vote,
-               -- Count comments on this post
-               COALESCE((SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id),0) AS comment_count
+               COALESCE((SELECT value FROM likes WHERE likes.post_id = posts.id AND likes.user_id = ?), 0) AS user_vote
         FROM posts
         JOIN users ON posts.user_id = users.id
-        ORDER BY posts.timestamp DESC
+        ORDER BY {FEED_ORDERINGS[sortby]}
         LIMIT ? OFFSET ?
     """, (user_id, per_page, offset)).fetchall()
 
     db.close()
-    return render_template("index.html", posts=posts, user=current_user(), page=page)
+    return render_template("index.html", posts=posts, user=current_user(), page=page, sortby=sortby)
 
 @main_bp.route("/login", methods=["GET", "POST"])
 def login():
@@ -97,6 +105,7 @@ def logout():
     return redirect(url_for("main.login"))
 
 @main_bp.route("/register", methods=["GET", "POST"])
+@rate_limit("register", form=True)
 def register():
     """
     User registration page and account creation.
@@ -120,19 +129,16 @@ def register():
             avatar_path = './avatars/default.png'  # Use default avatar
 
         # Create user account
-        db = get_db()
+        password_hash = generate_password_hash(password_raw)
         try:
-            db.execute(
+            write(lambda conn: conn.execute(
                 "INSERT INTO users (username, password, avatar, description) VALUES (?, ?, ?, ?)",
-                (username, generate_password_hash(password_raw), avatar_path, None)
-            )
-            db.commit()
+                (username, password_hash, avatar_path, None)
+            ))
             flash("Account created. Please log in.", "success")
-            db.close()
             return redirect(url_for("main.login"))
         except sqlite3.IntegrityError:
             # Username already exists
-            db.close()
             flash("Username already taken.", "error")
             return redirect(url_for("main.register"))
 
@@ -140,6 +146,7 @@ def register():
     return render_template("login.html", register=True, user=current_user())
 
 @main_bp.route("/upload", methods=["POST"])
+@rate_limit("upload", form=True)
 def upload():
     """
     Handle image uploads for new posts.
@@ -168,19 +175,38 @@ def upload():
         flash("Failed to save file.", "error")
         return redirect(url_for("main.index"))
 
+    # Small square copy for profile grids, size and placeholder for the feed
+    thumb = save_thumbnail(stored_filename)
+    meta = image_placeholder(stored_filename) or {}
+    # Perceptual hash to spot reposts of an existing image
+    phash = image_dhash(stored_filename)
+
     # Get caption and save post to database
     caption = request.form.get("caption", "").strip()
-    db = get_db()
-    db.execute(
-        "INSERT INTO posts (user_id, image, caption) VALUES (?, ?, ?)",
-        (user["id"], stored_filename, caption)
-    )
-    db.commit()
-    db.close()
+
+    def save_post(conn):
+        # Look up and insert in the same write so two copies uploaded together still get linked
+        duplicate_of = find_near_duplicate(conn, phash) if phash is not None else None
+        hash_values = phash_columns(phash) if phash is not None else (None,) * (PHASH_BANDS + 1)
+        conn.execute(
+            "INSERT INTO posts (user_id, image, caption, thumb, width, height, color, lqip,"
+            " phash, phash0, phash1, phash2, phash3, duplicate_of)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user["id"], stored_filename, caption, thumb, meta.get("width"), meta.get("height"), meta.get("color"), meta.get("lqip"))
+            + hash_values + (duplicate_of,)
+        )
+        update_user_stats(conn, user["id"], posts=1)
+        return duplicate_of
+
+    duplicate_of = write(save_post)
+    if duplicate_of:
+        flash("Uploaded! This image looks like a repost of an earlier post.", "success")
+        return redirect(url_for("main.index"))
     flash("Uploaded!", "success")
     return redirect(url_for("main.index"))
 
 @main_bp.route("/like/<int:post_id>", methods=["POST"])
+@rate_limit("react")
 def like(post_id):
     """
     Handle like/unlike functionality for posts.
@@ -192,56 +218,60 @@ def like(post_id):
     if not user:
         return jsonify(success=False), 401
 
-    db = get_db()
-
-    # Get the post owner (for notifications)
-    post = db.execute("SELECT user_id FROM posts WHERE id=?", (post_id,)).fetchone()
-    if not post:
-        return jsonify(success=False, error="Post not found"), 404
-
-    # Check if user already reacted to this post
-    existing = db.execute("SELECT * FROM likes WHERE user_id=? AND post_id=?", 
-                          (user["id"], post_id)).fetchone()
-
-    if existing:
-        if existing["value"] == 1:
-            # User already liked - remove the like (unlike)
-            db.execute("DELETE FROM likes WHERE id=?", (existing["id"],))
+    # Read and update the reaction in one write so concurrent clicks can't race
+    def react(conn):
+        # Get the post owner (for notifications)
+        post = conn.execute("SELECT user_id FROM posts WHERE id=?", (post_id,)).fetchone()
+        if not post:
+            return None
+
+        # Check if user already reacted to this post
+        existing = conn.execute("SELECT * FROM likes WHERE user_id=? AND post_id=?", 
+                                (user["id"], post_id)).fetchone()
+
+        if existing:
+            if existing["value"] == 1:
+                # User already liked - remove the like (unlike)
+                conn.execute("DELETE FROM likes WHERE id=?", (existing["id"],))
+                update_reaction_stats(conn, post_id, 1, 0)
+            else:
+                # User disliked - change to like
+                conn.execute("UPDATE likes SET value=1 WHERE id=?", (existing["id"],))
+                update_reaction_stats(conn, post_id, existing["value"], 1)
+
+                # Send notification to post owner (if not self-like)
+                if post["user_id"] != user["id"]:
+                    conn.execute("""
+                        INSERT INTO notifications (maker_id, receiver_id, type, reference_id)
+                        VALUES (?, ?, ?, ?)
+                    """, (user["id"], post["user_id"], 0, post_id))  # type 0 = like
         else:
-            # User disliked - change to like
-            db.execute("UPDATE likes SET value=1 WHERE id=?", (existing["id"],))
+            # First time reaction - add like
+            conn.execute("INSERT INTO likes (user_id, post_id, value) VALUES (?, ?, 1)", 
+                         (user["id"], post_id))
+            update_reaction_stats(conn, post_id, 0, 1)
 
             # Send notification to post owner (if not self-like)
             if post["user_id"] != user["id"]:
-                db.execute("""
+                conn.execute("""
                     INSERT INTO notifications (maker_id, receiver_id, type, reference_id)
                     VALUES (?, ?, ?, ?)
                 """, (user["id"], post["user_id"], 0, post_id))  # type 0 = like
-    else:
-        # First time reaction - add like
-        db.execute("INSERT INTO likes (user_id, post_id, value) VALUES (?, ?, 1)", 
-                   (user["id"], post_id))
-
-        # Send notification to post owner (if not self-like)
-        if post["user_id"] != user["id"]:
-            db.execute("""
-                INSERT INTO notifications (maker_id, receiver_id, type, reference_id)
-                VALUES (?, ?, ?, ?)
-            """, (user["id"], post["user_id"], 0, post_id))  # type 0 = like
-
-    db.commit()
-
-    # Get updated reaction counts
-    like_count = db.execute("SELECT COUNT(*) FROM likes WHERE post_id=? AND value=1", 
-                            (post_id,)).fetchone()[0]
-    dislike_count = db.execute("SELECT COUNT(*) FROM likes WHERE post_id=? AND value=-1", 
-                               (post_id,)).fetchone()[0]
-    db.close()
+
+        # Get updated reaction counts (kept on the post row)
+        counts = conn.execute("SELECT like_count, dislike_count FROM posts WHERE id=?", (post_id,)).fetchone()
+        return counts["like_count"], counts["dislike_count"]
+
+    counts = write(react)
+    if counts is None:
+        return jsonify(success=False, error="Post not found"), 404
+    like_count, dislike_count = counts
 
     # Return JSON response for AJAX
     return jsonify(success=True, like_count=like_count, dislike_count=dislike_count)
 
 @main_bp.route("/dislike/<int:post_id>", methods=["POST"])
+@rate_limit("react")
 def dislike(post_id):
     """
     Handle like/unlike functionality for posts.
@@ -253,51 +283,54 @@ def dislike(post_id):
     if not user:
         return jsonify(success=False), 401
 
-    db = get_db()
-
-    # Get the post owner (for notifications)
-    post = db.execute("SELECT user_id FROM posts WHERE id=?", (post_id,)).fetchone()
-    if not post:
-        return jsonify(success=False, error="Post not found"), 404
-
-    # Check if user already reacted to this post
-    existing = db.execute("SELECT * FROM likes WHERE user_id=? AND post_id=?", 
-                          (user["id"], post_id)).fetchone()
-
-    if existing:
-        if existing["value"] == -1:
-            # User already disliked - remove the dislike (undislike)
-            db.execute("DELETE FROM likes WHERE id=?", (existing["id"],))
+    # Read and update the reaction in one write so concurrent clicks can't race
+    def react(conn):
+        # Get the post owner (for notifications)
+        post = conn.execute("SELECT user_id FROM posts WHERE id=?", (post_id,)).fetchone()
+        if not post:
+            return None
+
+        # Check if user already reacted to this post
+        existing = conn.execute("SELECT * FROM likes WHERE user_id=? AND post_id=?", 
+                                (user["id"], post_id)).fetchone()
+
+        if existing:
+            if existing["value"] == -1:
+                # User already disliked - remove the dislike (undislike)
+                conn.execute("DELETE FROM likes WHERE id=?", (existing["id"],))
+                update_reaction_stats(conn, post_id, -1, 0)
+            else:
+                # User liked - change to dislike
+                conn.execute("UPDATE likes SET value=-1 WHERE id=?", (existing["id"],))
+                update_reaction_stats(conn, post_id, existing["value"], -1)
+
+                # Send notification to post owner (if not self-like)
+                if post["user_id"] != user["id"]:
+                    conn.execute("""
+                        INSERT INTO notifications (maker_id, receiver_id, type, reference_id)
+                        VALUES (?, ?, ?, ?)
+                    """, (user["id"], post["user_id"], 1, post_id))  # type 1 = dislike
         else:
-            # User liked - change to dislike
-            db.execute("UPDATE likes SET value=-1 WHERE id=?", (existing["id"],))
+            # First time reaction - add like
+            conn.execute("INSERT INTO likes (user_id, post_id, value) VALUES (?, ?, -1)", 
+                         (user["id"], post_id))
+            update_reaction_stats(conn, post_id, 0, -1)
 
             # Send notification to post owner (if not self-like)
             if post["user_id"] != user["id"]:
-                db.execute("""
+                conn.execute("""
                     INSERT INTO notifications (maker_id, receiver_id, type, reference_id)
                     VALUES (?, ?, ?, ?)
                 """, (user["id"], post["user_id"], 1, post_id))  # type 1 = dislike
-    else:
-        # First time reaction - add like
-        db.execute("INSERT INTO likes (user_id, post_id, value) VALUES (?, ?, -1)", 
-                   (user["id"], post_id))
-
-        # Send notification to post owner (if not self-like)
-        if post["user_id"] != user["id"]:
-            db.execute("""
-                INSERT INTO notifications (maker_id, receiver_id, type, reference_id)
-                VALUES (?, ?, ?, ?)
-            """, (user["id"], post["user_id"], 1, post_id))  # type 1 = dislike
-
-    db.commit()
-
-    # Get updated reaction counts
-    like_count = db.execute("SELECT COUNT(*) FROM likes WHERE post_id=? AND value=1", 
-                            (post_id,)).fetchone()[0]
-    dislike_count = db.execute("SELECT COUNT(*) FROM likes WHERE post_id=? AND value=-1", 
-                               (post_id,)).fetchone()[0]
-    db.close()
+
+        # Get updated reaction counts (kept on the post row)
+        counts = conn.execute("SELECT like_count, dislike_count FROM posts WHERE id=?", (post_id,)).fetchone()
+        return counts["like_count"], counts["dislike_count"]
+
+    counts = write(react)
+    if counts is None:
+        return jsonify(success=False, error="Post not found"), 404
+    like_count, dislike_count = counts
 
     # Return JSON response for AJAX
     return jsonify(success=True, like_count=like_count, dislike_count=dislike_count)
@@ -307,15 +340,17 @@ def dislike(post_id):
 @main_bp.route("/post/<int:post_id>")
 def view_post(post_id):
     """
-    Display a single post with its comments and reaction counts.
-    Shows the full post details, all comments, and user's current reaction.
+    Display a single post with its reaction counts and the first page of comments.
+    Further comments are loaded by the page through post_comments().
     """
     db = get_db()
     
     # Get the post with author information
     post = db.execute("""
-        SELECT posts.*, users.username, users.avatar
+        SELECT posts.*, users.username, users.avatar,
+               original.id AS original_id    -- Earlier post with the same image, if still there
         FROM posts JOIN users ON posts.user_id = users.id
+        LEFT JOIN posts AS original ON original.id = posts.duplicate_of
         WHERE posts.id = ?
     """, (post_id,)).fetchone()
     
@@ -323,17 +358,15 @@ def view_post(post_id):
         db.close()
         return "Post not found", 404
 
-    # Get all comments for this post with author info
-    comments = db.execute("""
-        SELECT comments.*, users.username, users.avatar
-        FROM comments JOIN users ON comments.user_id = users.id
-        WHERE comments.post_id = ?
-        ORDER BY comments.timestamp ASC
-    """, (post_id,)).fetchall()
-
-    # Get reaction counts
-    like_count = db.execute("SELECT COUNT(*) AS c FROM likes WHERE post_id = ? AND value = 1", (post_id,)).fetchone()["c"]
-    dislike_count = db.execute("SELECT COUNT(*) AS c FROM likes WHERE post_id = ? AND value = -1", (post_id,)).fetchone()["c"]
+    # Get the first page of comments ("oldest" or "newest" first).
+    # ?around=<comment id> (comment notifications) starts the page at that
+    # comment, so it is shown however many comments came before it.
+    order = comment_order_arg()
+    around = request.args.get("around", type=int)
+    cursor = None
+    if around is not None:
+        cursor = around + 1 if order == "newest" else around - 1  # The cursor itself is excluded
+    comments, next_cursor = get_comments_page(db, post_id, order, cursor)
 
     # Get current user's reaction to this post
     user_vote_row = None
@@ -345,9 +378,34 @@ def view_post(post_id):
             user_vote = user_vote_row["value"] or 0
 
     db.close()
-    return render_template("post.html", post=post, comments=comments, like_count=like_count, dislike_count=dislike_count, user_vote=user_vote, user=current_user())
+    # Reaction counts are kept on the post row
+    return render_template("post.html", post=post, comments=comments, next_cursor=next_cursor, order=order, around=around,
+                           like_count=post["like_count"], dislike_count=post["dislike_count"], user_vote=user_vote, user=current_user())
+
+@main_bp.route("/post/<int:post_id>/comments")
+def post_comments(post_id):
+    """
+    Get the next page of a post's comments as JSON ("Load more" button).
+    Query args: order=oldest|newest, cursor=<id of the last comment shown>.
+    """
+    order = comment_order_arg()
+    cursor = request.args.get("cursor", type=int)
+
+    db = get_db()
+    comments, next_cursor = get_comments_page(db, post_id, order, cursor)
+    db.close()
+
+    return jsonify(success=True, comments=[dict(c) for c in comments], next_cursor=next_cursor)
+
+def comment_order_arg():
+    """
+    Read the ?order= argument for comment lists, defaulting to oldest first.
+    """
+    order = request.args.get("order", "oldest")
+    return order if order in ("oldest", "newest") else "oldest"
 
 @main_bp.route("/comment/<int:post_id>", methods=["POST"])
+@rate_limit("comment", form=True)
 def add_comment(post_id):
     """
     Add a new comment to a post.
@@ -367,47 +425,33 @@ def add_comment(post_id):
         return redirect(url_for("main.view_post", post_id=post_id))
         
     # Save comment to database
-    db = get_db()
-    cur = db.execute(
-        "INSERT INTO comments (post_id, user_id, text) VALUES (?, ?, ?)",
-        (post_id, user["id"], text)
-    )
-    comment_id = cur.lastrowid  # Get the ID of the new comment
-    
-    # Send notification to post owner (if not self-comment)
-    post = db.execute("SELECT user_id FROM posts WHERE id = ?", (post_id,)).fetchone()
-    if post and post["user_id"] != user["id"]:
-        db.execute("""
-            INSERT INTO notifications (maker_id, receiver_id, type, reference_id, comment_id)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user["id"], post["user_id"], 2, post_id, comment_id))  # type 2 = comment
-    
-    db.commit()
-    db.close()
+    def save_comment(conn):
+        cur = conn.execute(
+            "INSERT INTO comments (post_id, user_id, text) VALUES (?, ?, ?)",
+            (post_id, user["id"], text)
+        )
+        comment_id = cur.lastrowid  # Get the ID of the new comment
+        update_post_stats(conn, post_id, comments=1)
+        
+        # Send notification to post owner (if not self-comment)
+        post = conn.execute("SELECT user_id FROM posts WHERE id = ?", (post_id,)).fetchone()
+        if post and post["user_id"] != user["id"]:
+            conn.execute("""
+                INSERT INTO notifications (maker_id, receiver_id, type, reference_id, comment_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, (user["id"], post["user_id"], 2, post_id, comment_id))  # type 2 = comment
+
+    write(save_comment)
     flash("Comment added!", "success")
     return redirect(url_for("main.view_post", post_id=post_id))
 
-def get_comments_for_post(post_id):
-    """
-    Helper function to get all comments for a specific post.
-    Used for displaying comments in various contexts.
-    """
-    db = get_db()
-    comments = db.execute("""
-        SELECT comments.text, comments.timestamp, users.username
-        FROM comments
-        JOIN users ON comments.user_id = users.id
-        WHERE comments.post_id = ?
-        ORDER BY comments.timestamp ASC
-    """, (post_id,)).fetchall()
-    db.close()
-    return comments
-
 @main_bp.route("/delete/<int:post_id>", methods=["POST"])
+@rate_limit("delete", form=True)
 def delete_post(post_id):
     """
     Delete a post (owner only).
-    Removes the post, all its comments, likes, and the associated image file.
+    Removes the post, all its comments, likes and notifications in one transaction,
+    and queues its image and thumbnail for deletion once that transaction commits.
     Only the post owner can delete their posts.
     """
     # Check authentication
@@ -416,35 +460,33 @@ def delete_post(post_id):
         flash("Login to delete posts.", "error")
         return redirect(url_for("main.login"))
 
-    db = get_db()
-    post = db.execute("SELECT * FROM posts WHERE id = ?", (post_id,)).fetchone()
+    def remove_post(conn):
+        post = conn.execute("SELECT * FROM posts WHERE id = ?", (post_id,)).fetchone()
+        if not post or post["user_id"] != user["id"]:
+            return post  # Missing or not the owner: change nothing
+
+        # Delete all related data (cascade delete), all in the same transaction
+        conn.execute("DELETE FROM notifications WHERE reference_id = ? AND type IN (0, 1, 2)", (post_id,))  # Like/dislike/comment notifications
+        conn.execute("DELETE FROM likes WHERE post_id = ?", (post_id,))      # Remove all likes
+        conn.execute("DELETE FROM comments WHERE post_id = ?", (post_id,))   # Remove all comments
+        conn.execute("DELETE FROM posts WHERE id = ?", (post_id,))          # Remove the post
+        update_user_stats(conn, user["id"], posts=-1, likes=-post["like_count"])
+        # The files are only unlinked by collect_deleted_files() after this commits
+        enqueue_file_deletion(conn, f"uploads/{post['image']}", post["thumb"])
+        return post
+
+    post = write(remove_post)
     
     # Validate post exists
     if not post:
-        db.close()
         flash("Post not found.", "error")
         return redirect(url_for("main.index"))
     
     # Check ownership
     if post["user_id"] != user["id"]:
-        db.close()
         flash("You can only delete your own posts.", "error")
         return redirect(url_for("main.index"))
 
-    # Delete the associated image file
-    try:
-        remove_upload_file(post["image"])
-    except Exception:
-        # Silently handle file deletion errors
-        pass
-
-    # Delete all related data (cascade delete)
-    db.execute("DELETE FROM likes WHERE post_id = ?", (post_id,))      # Remove all likes
-    db.execute("DELETE FROM comments WHERE post_id = ?", (post_id,))   # Remove all comments
-    db.execute("DELETE FROM posts WHERE id = ?", (post_id,))          # Remove the post
-    db.commit()
-    db.close()
-
     flash("Post deleted.", "success")
     return redirect(url_for("main.index"))
 
@@ -452,7 +494,8 @@ def delete_post(post_id):
 def profile(username=None):
     """
     Display a user's profile page with their posts.
-    Shows user info, avatar, description, and all their posts.
+    Shows user info, avatar, description, post/like totals and the first page of posts
+    (the grid loads more through profile_posts() as the user scrolls).
     If no username provided, redirects to current user's profile.
     """
     # Handle case where no username is provided
@@ -470,13 +513,37 @@ def profile(username=None):
         db.close()
         return "Error user not found.", 404
     
-    # Get all posts by this user
-    posts = db.execute("SELECT * FROM posts WHERE user_id = ? ORDER BY timestamp DESC", (profile_user["id"],)).fetchall()
+    # Get the first page of the grid and the cached post/like totals
+    posts, next_cursor = get_profile_posts_page(db, profile_user["id"])
+    stats = db.execute("SELECT post_count, like_count FROM user_stats WHERE user_id = ?", (profile_user["id"],)).fetchone()
     db.close()
     
-    return render_template("profile.html", profile=profile_user, posts=posts, user=current_user())
+    return render_template("profile.html", profile=profile_user, posts=posts, next_cursor=next_cursor, thumb_size=THUMB_SIZE,
+                           post_count=stats["post_count"] if stats else 0,
+                           like_count=stats["like_count"] if stats else 0,
+                           user=current_user())
+
+@main_bp.route("/profile/<username>/posts")
+def profile_posts(username):
+    """
+    Get the next page of a user's profile grid as JSON (infinite scroll).
+    Query args: cursor=<id of the last post shown>.
+    """
+    cursor = request.args.get("cursor", type=int)
+
+    db = get_db()
+    profile_user = db.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    if not profile_user:
+        db.close()
+        return jsonify(success=False, error="User not found"), 404
+
+    posts, next_cursor = get_profile_posts_page(db, profile_user["id"], cursor)
+    db.close()
+
+    return jsonify(success=True, posts=[dict(p) for p in posts], next_cursor=next_cursor)
 
 @main_bp.route("/profile/avatar", methods=["POST"])
+@rate_limit("profile", form=True)
 def change_avatar():
     """
     Handle avatar upload/change for the current user.
@@ -499,11 +566,13 @@ def change_avatar():
         flash("Invalid avatar file.", "error")
         return redirect(url_for("main.profile", username=user["username"]))
     
-    # Update user's avatar in database
-    db = get_db()
-    db.execute("UPDATE users SET avatar = ? WHERE id = ?", (avatar_path, user["id"]))
-    db.commit()
-    db.close()
+    # Update user's avatar in database and queue the old file for deletion
+    def replace_avatar(conn):
+        old = conn.execute("SELECT avatar FROM users WHERE id = ?", (user["id"],)).fetchone()
+        conn.execute("UPDATE users SET avatar = ? WHERE id = ?", (avatar_path, user["id"]))
+        enqueue_file_deletion(conn, old["avatar"])
+
+    write(replace_avatar)
     
     flash("Avatar updated!", "success")
     return redirect(url_for("main.profile", username=user["username"]))
@@ -517,6 +586,7 @@ def uploaded_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename)
 
 @main_bp.route("/description", methods=["POST"])
+@rate_limit("profile")
 def change_description():
     """
     Update user's profile description via AJAX.
@@ -537,10 +607,7 @@ def change_description():
         return jsonify(success=False, error="Description too long (max 1000 chars)."), 400
 
     # Update description in database
-    db = get_db()
-    db.execute("UPDATE users SET description = ? WHERE id = ?", (description, user["id"]))
-    db.commit()
-    db.close()
+    write(lambda conn: conn.execute("UPDATE users SET description = ? WHERE id = ?", (description, user["id"])))
     
     return jsonify({"success": True, "description": description})
 
@@ -613,6 +680,7 @@ def get_notifications():
 
 
 @main_bp.route("/notifications/<int:notif_id>/seen", methods=["POST"])
+@rate_limit("notifications")
 def mark_notification_seen(notif_id):
     """
     Mark a specific notification as seen/read.
@@ -624,20 +692,58 @@ def mark_notification_seen(notif_id):
     if not user:
         return jsonify(success=False, error="Unauthorized"), 401
 
-    db = get_db()
-    
     # Mark notification as seen (only for current user's notifications)
-    cur = db.execute(
+    cur = write(lambda conn: conn.execute(
         "UPDATE notifications SET seen = 1 WHERE id = ? AND receiver_id = ?",
         (notif_id, user["id"])
-    )
-    db.commit()
-    
-    # Verify the update was successful
-    # (rowcount may not be reliable, so we check the actual state)
-    changed = db.execute("SELECT COUNT(1) AS cnt FROM notifications WHERE id = ? AND seen = 1", (notif_id,)).fetchone()["cnt"]
-    db.close()
+    ))
 
-    if not changed:
+    # rowcount = rows matched, so 0 means it doesn't exist or isn't the user's
+    if not cur.rowcount:
         return jsonify(success=False, error="Not found or not allowed"), 404
-    return jsonify(success=True)
\ No newline at end of file
+    return jsonify(success=True)
+
+@main_bp.route("/notifications/seen", methods=["POST"])
+@rate_limit("notifications")
+def mark_notifications_seen():
+    """
+    Mark many notifications as seen in one UPDATE.
+    JSON body, one of:
+    - {"ids": [1, 2, 3]}  - these notifications (at most NOTIFICATIONS_SEEN_MAX_IDS)
+    - {"up_to": 42}       - every unseen notification with id <= 42, i.e. everything
+                            the user had loaded, not what arrived since
+    Returns the ids that were actually changed (already seen ones are skipped).
+    """
+    # Check authentication
+    user = current_user()
+    if not user:
+        return jsonify(success=False, error="Unauthorized"), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(success=False, error="Send a JSON object with ids or up_to."), 400
+    try:
+        if "up_to" in data:
+            where, params = "id <= ?", [int(data["up_to"])]
+        else:
+            ids = data.get("ids")
+            if not isinstance(ids, list) or not 0 < len(ids) <= NOTIFICATIONS_SEEN_MAX_IDS:
+                return jsonify(success=False, error=f"Send 1 to {NOTIFICATIONS_SEEN_MAX_IDS} ids or up_to."), 400
+            ids = [int(i) for i in ids]
+            where, params = f"id IN ({','.join('?' * len(ids))})", ids
+    except (TypeError, ValueError):
+        return jsonify(success=False, error="Ids must be integers."), 400
+
+    # Uses idx_notifications_receiver (receiver_id, seen, id)
+    seen = write(lambda conn: [row["id"] for row in conn.execute(
+        f"UPDATE notifications SET seen = 1 WHERE receiver_id = ? AND seen = 0 AND {where} RETURNING id",
+        [user["id"]] + params
+    )])
+    return jsonify(success=True, seen=sorted(seen))
+
+@main_bp.route("/metrics")
+def metrics():
+    """
+    Expose the in-process counters and gauges (rate limiter hits...) as JSON.
+    """
+    return jsonify(Metrics.snapshot())
@@ -0,0 +1,70 @@
+// post.html: "Load more comments" button
+// Fetches the next page from /post/<id>/comments and appends it to #comment-list.
+document.addEventListener('DOMContentLoaded', () => {
+  const btn = document.getElementById('load-more-comments');
+  const list = document.getElementById('comment-list');
+  if (!btn || !list) return;
+
+  // Build the same markup as the server-rendered comments in post.html
+  function renderComment(c) {
+    const profileUrl = `/profile/${encodeURIComponent(c.username)}`;
+
+    const wrapper = document.createElement('div');
+    wrapper.className = 'comment';
+
+    const avatarLink = document.createElement('a');
+    avatarLink.href = profileUrl;
+    const avatar = document.createElement('img');
+    avatar.src = `/static/${c.avatar}`;
+    avatar.className = 'avatar-sm';
+    avatar.alt = 'Avatar';
+    avatarLink.appendChild(avatar);
+
+    const body = document.createElement('div');
+    body.className = 'comment-body';
+    body.id = `comment-${c.id}`;
+
+    const nameLink = document.createElement('a');
+    nameLink.href = profileUrl;
+    const name = document.createElement('strong');
+    name.className = 'username';
+    name.style.fontSize = '100%';
+    name.textContent = c.username;
+    nameLink.appendChild(name);
+
+    const text = document.createElement('p');
+    text.className = 'post-text';
+    text.textContent = c.text;
+
+    const time = document.createElement('span');
+    time.className = 'timestamp';
+    time.textContent = c.timestamp;
+
+    body.append(nameLink, text, time);
+    wrapper.append(avatarLink, body);
+    return wrapper;
+  }
+
+  btn.addEventListener('click', async () => {
+    btn.disabled = true;
+    const params = new URLSearchParams({ order: btn.dataset.order, cursor: btn.dataset.cursor });
+    try {
+      const res = await fetch(`/post/${btn.dataset.postId}/comments?${params}`);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const data = await res.json();
+
+      data.comments.forEach(c => list.appendChild(renderComment(c)));
+      if (typeof updateTimestamps === 'function') updateTimestamps();
+
+      if (data.next_cursor === null) {
+        btn.remove(); // last page reached
+      } else {
+        btn.dataset.cursor = data.next_cursor;
+        btn.disabled = false;
+      }
+    } catch (err) {
+      console.error('Failed to load comments', err);
+      btn.disabled = false;
+    }
+  });
+});
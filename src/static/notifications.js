@@ -0,0 +1,126 @@
+// side.html: notification panel
+// Loads /notifications when the bell is clicked and marks them seen
+// (one by one when opened, or all at once with the check button).
+document.addEventListener("DOMContentLoaded", () => {
+  const openBtn = document.getElementById("notif-open");
+  const overlay = document.getElementById("notif-overlay");
+  const closeBtn = document.getElementById("notif-close");
+  const notifList = document.getElementById("notif-list");
+  const seenAllBtn = document.getElementById("notif-seen-all");
+  newNotification = false;
+  let latestNotifId = 0;  // Highest id loaded, "mark all seen" stops there
+
+  // Open panel
+  openBtn.addEventListener("click", async () => {
+    overlay.classList.remove("hidden");
+    // Fetch latest notifications
+    let res = await fetch("/notifications");
+    let data = await res.json();
+    notifList.innerHTML = "";
+
+    if (data.success && data.notifications.length > 0) {
+      latestNotifId = Math.max(...data.notifications.map(n => n.id));
+      data.notifications.forEach(n => {
+        let li = document.createElement("li");
+
+        // safe comment text
+        const commentText = (n.type === 2 && n.comment && n.comment.content) ? `commented "${n.comment.content}" on your post` : 
+                            (n.type === 2 ? "commented on your post" : 
+                            n.type === 0 ? "liked your post" :
+                            n.type === 1 ? "disliked your post" :
+                            "sent you a notification");
+
+        // Base HTML: add data-notif-id to the post link and a dedicated class 'notif-post-link'
+        li.innerHTML = `
+          <img src="/static/${n.maker && n.maker.avatar ? n.maker.avatar : 'default.png'}" alt="avatar" width="40" height="40">
+          <span style="color: black;">
+            <a href="/profile/${n.maker ? n.maker.username : '#'}"><strong>${n.maker ? n.maker.username : 'Someone'}</strong></a>
+            <a href="/post/${n.post ? n.post.id : '#'}${n.type === 2 ? `?around=${n.comment.id}#comment-${n.comment.id}` : ''}" 
+               class="notif-post-link ${!n.seen ? 'fancy-link neon' : ''}" 
+               data-notif-id="${n.id}">
+              ${commentText}
+            </a>
+            <br>
+            <small class="timestamp">${n.created_at}</small>
+          </span>
+        `;
+
+        // Attach click handler to the post link so clicking marks the notification seen then navigates
+        // Use event listener after element is created and appended (or before append is fine too)
+        // but we need to query inside the li
+        const postLink = li.querySelector('.notif-post-link');
+
+        if (postLink) {
+          postLink.addEventListener('click', async function (e) {
+            e.preventDefault();
+
+            // optimistic UI update: remove styling immediately
+            if (!n.seen) {
+              postLink.classList.remove('fancy-link', 'neon');
+              newNotification = true;
+            }
+
+            // send request to mark as seen; ignore failures but log them
+            const notifId = this.dataset.notifId;
+            try {
+              // adjust method/headers if you use CSRF tokens
+              await fetch(`/notifications/${notifId}/seen`, {
+                method: 'POST',
+                headers: {
+                  'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({}) // body not required, but helps some frameworks
+              });
+              // mark locally so next clicks won't re-fire update
+              n.seen = true;
+            } catch (err) {
+              console.error('Failed to mark notification seen', err);
+              // If you prefer, revert the UI change on failure:
+              // postLink.classList.add('fancy-link','neon');
+            }
+
+            // Finally navigate to the post
+            window.location.href = this.href;
+          });
+        }
+
+        notifList.appendChild(li);
+      });
+
+      updateTimestamps();
+    } else {
+      notifList.innerHTML = "<li><span style='color:black'>No notifications... yet</span></li>";
+    }
+  });
+
+  // Mark everything loaded as seen in one request
+  seenAllBtn.addEventListener("click", async () => {
+    if (!latestNotifId) return;
+    try {
+      const res = await fetch("/notifications/seen", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ up_to: latestNotifId })
+      });
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      notifList.querySelectorAll(".notif-post-link").forEach(link => link.classList.remove("fancy-link", "neon"));
+    } catch (err) {
+      console.error("Failed to mark notifications seen", err);
+    }
+  });
+
+  // Close panel
+  closeBtn.addEventListener("click", () => {
+    overlay.classList.add("hidden");
+  });
+
+  // Close if clicking outside panel
+  overlay.addEventListener("click", e => {
+    if (e.target === overlay) {
+      overlay.classList.add("hidden");
+    }
+  });
+  if (newNotification) {
+    openBtn.style = "position: fixed;bottom: 20px;right: 20px;background: #222;color: #fff;border: none;border-radius: 50%;width: 50px;height: 50px;font-size: 1.5rem;cursor: pointer;z-index: 1100;box-shadow: 0 0 0 4px red, 0 4px 8px rgba(0, 0, 0, 0.3);"
+  }
+});
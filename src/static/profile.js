@@ -0,0 +1,71 @@
+// profile.html: infinite scroll for the posts grid
+// When the sentinel below the grid comes into view, the next page is fetched
+// from /profile/<username>/posts and appended to #posts-grid.
+document.addEventListener('DOMContentLoaded', () => {
+  const grid = document.getElementById('posts-grid');
+  const sentinel = document.getElementById('posts-grid-sentinel');
+  if (!grid || !sentinel) return;
+
+  const isOwner = grid.dataset.owner === '1';
+  const thumbSize = Number(grid.dataset.thumbSize);
+  let loading = false;
+
+  // Build the same markup as the server-rendered grid items in profile.html
+  function renderPost(p) {
+    const item = document.createElement('div');
+    item.className = 'post-card-grid';
+
+    const link = document.createElement('a');
+    link.href = `/post/${p.id}`;
+    const img = document.createElement('img');
+    img.src = `/static/${p.thumb}`;
+    img.className = 'post-thumb';
+    img.alt = 'Post';
+    img.loading = 'lazy';
+    img.width = img.height = thumbSize;
+    if (p.color) img.style.backgroundColor = p.color; // Placeholder until the thumbnail loads
+    link.appendChild(img);
+    item.appendChild(link);
+
+    if (isOwner) {
+      const del = document.createElement('a');
+      del.href = '#';
+      del.className = 'delete-btn';
+      del.textContent = 'X';
+      del.addEventListener('click', (e) => {
+        e.preventDefault();
+        deletePost(p.id);
+      });
+      item.appendChild(del);
+    }
+    return item;
+  }
+
+  async function loadMore() {
+    if (loading) return;
+    loading = true;
+    const username = encodeURIComponent(grid.dataset.username);
+    try {
+      const res = await fetch(`/profile/${username}/posts?cursor=${sentinel.dataset.cursor}`);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const data = await res.json();
+
+      data.posts.forEach(p => grid.appendChild(renderPost(p)));
+      if (data.next_cursor === null) {
+        observer.disconnect();
+        sentinel.remove(); // last page reached
+      } else {
+        sentinel.dataset.cursor = data.next_cursor;
+      }
+    } catch (err) {
+      console.error('Failed to load posts', err);
+    }
+    loading = false;
+  }
+
+  // Start loading a bit before the sentinel is actually visible
+  const observer = new IntersectionObserver((entries) => {
+    if (entries.some(e => e.isIntersecting)) loadMore();
+  }, { rootMargin: '400px' });
+  observer.observe(sentinel);
+});